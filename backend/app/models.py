@@ -8,6 +8,11 @@ class PaymentStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled"
+    # Written by the production routers (Fiserv S2S / reconciliation)
+    WAITING = "waiting"
+    APPROVED = "approved"
+    DECLINED = "declined"
+    EXPIRED = "expired"
 
 class PaymentMethod(str, Enum):
     CARD = "card"
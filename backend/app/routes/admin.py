@@ -0,0 +1,105 @@
+"""
+Admin API for parish staff (exports, browsing payments)
+Requires the X-Admin-Token header to match ADMIN_API_TOKEN; the whole API is
+disabled while ADMIN_API_TOKEN is unset.
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+import hmac
+import os
+
+from ..utils.payment_export import export_payments
+from ..utils.payment_index import payment_index, InvalidCursor, MAX_PAGE_SIZE
+from ..utils import lanes
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Constant-time check of the admin token"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API is not configured")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.get("/payments/export", dependencies=[Depends(require_admin)])
+@lanes.background
+async def export_payments_endpoint(
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    date_from: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    goal_id: Optional[str] = None,
+    status: Optional[str] = None,
+    gzip: bool = False
+):
+    """Stream payments as CSV or JSONL; memory use does not grow with the export size"""
+    stream = export_payments(format, gzip, date_from=date_from, date_to=date_to,
+                             goal_id=goal_id, status=status)
+    
+    filename = f"payments-{datetime.now().strftime('%Y%m%d')}.{format}" + (".gz" if gzip else "")
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if gzip:
+        media_type = "application/gzip"
+    
+    # Sync generator: Starlette iterates it in the threadpool, off the event loop
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
+
+@router.get("/payments", dependencies=[Depends(require_admin)])
+@lanes.background
+async def list_payments(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    sort: str = Query("created_at", pattern="^(created_at|amount)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    status: Optional[str] = None,
+    goal_id: Optional[str] = None,
+    donor_email: Optional[str] = None,
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0)
+):
+    """
+    Browse payments newest-first (or by amount) with keyset pagination.
+    Pass next_cursor back as `cursor` to get the following page.
+    """
+    await payment_index.refresh()
+    try:
+        items, next_cursor = payment_index.query(
+            sort=sort, descending=(order == "desc"), cursor=cursor, limit=limit,
+            status=status, goal_id=goal_id, donor_email=donor_email,
+            min_amount=min_amount, max_amount=max_amount
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "limit": limit
+    }
+
+@router.get("/payments/search", dependencies=[Depends(require_admin)])
+@lanes.background
+async def search_payments(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Find payments by donor name, email, intention message or order ID.
+    Every word is matched as a prefix, diacritics are ignored ("lucja kow"
+    finds "Łucja Kowalska"); results are newest first.
+    """
+    await payment_index.refresh()
+    items, total = payment_index.search(q, limit)
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit
+    }
@@ -0,0 +1,67 @@
+"""
+Composite bootstrap payload for the donation pages
+The home page used to fetch /organization and /organization/stats, the goal
+page /organization and /organization/goal/{id}: two round trips and two
+organization.json parses per page view. /api/bootstrap[/{goal_id}] returns
+everything a page needs in one response.
+
+The payload is built once per data version: the response cache keeps its
+body and ETag until a payment is approved or organization.json changes, and
+concurrent rebuilds after such a change are coalesced.
+"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
+import os
+
+from ..utils.response_cache import response_cache
+from ..utils import lanes
+from .organization import reads, get_organization_shared, compute_stats
+from .payments_production import InitiatePaymentRequest
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+def amount_limits(model) -> Dict[str, Any]:
+    """Bounds of the model's `amount` field, so the client validates exactly what the API accepts"""
+    limits = {'min_amount': None, 'min_exclusive': False, 'max_amount': None, 'max_exclusive': False}
+    for constraint in model.model_fields['amount'].metadata:
+        for attr, key, exclusive in (('gt', 'min', True), ('ge', 'min', False), ('lt', 'max', True), ('le', 'max', False)):
+            value = getattr(constraint, attr, None)
+            if value is not None:
+                limits[f'{key}_amount'] = float(value)
+                limits[f'{key}_exclusive'] = exclusive
+    return limits
+
+# What the donation form needs to validate and render amounts client-side
+# (limits of the mounted payments router's InitiatePaymentRequest)
+PAYMENT_CONFIG = {
+    'currency': 'PLN',
+    **amount_limits(InitiatePaymentRequest),
+    'preset_amounts': [int(a) for a in os.getenv('PAYMENT_PRESET_AMOUNTS', '10,25,50,100,200,500').split(',')],
+}
+
+async def build_bootstrap(goal_id: Optional[str]) -> Dict[str, Any]:
+    org = await get_organization_shared()
+    payload = {
+        'organization': org.model_dump(),
+        'stats': await reads.do(('stats', response_cache.version()), compute_stats),
+        'payment': PAYMENT_CONFIG,
+    }
+    if goal_id is not None:
+        goal = next((g for g in org.goals if g.id == goal_id), None)
+        if not goal:
+            raise HTTPException(status_code=404, detail="Goal not found")
+        payload['goal'] = goal.model_dump()
+    return payload
+
+@router.get("/bootstrap")
+@lanes.normal
+async def get_bootstrap() -> Dict[str, Any]:
+    """Organization, progress stats and payment config for the home page"""
+    return await reads.do(('bootstrap', None, response_cache.version()), lambda: build_bootstrap(None))
+
+@router.get("/bootstrap/{goal_id}")
+@lanes.normal
+async def get_goal_bootstrap(goal_id: str) -> Dict[str, Any]:
+    """The home page payload plus one goal, for the goal page"""
+    return await reads.do(('bootstrap', goal_id, response_cache.version()), lambda: build_bootstrap(goal_id))
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from ..utils import tracing, lanes
+from .admin import require_admin
+
+router = APIRouter(prefix="/api/debug", tags=["debug"])
+
+# Traces carry donor data: admin token required
+@router.get("/trace/{order_id}", dependencies=[Depends(require_admin)])
+@lanes.background
+async def get_trace(order_id: str, format: str = Query("json", pattern="^(json|jsonl|otlp)$")):
+    """Spans recorded for an order: initiate, donor status polling and S2S notification"""
+    spans = tracing.buffer.get(order_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No trace recorded for this order")
+
+    if format == "jsonl":
+        return Response(content=tracing.to_jsonl(spans), media_type="application/x-ndjson")
+    if format == "otlp":
+        return tracing.to_otlp(spans)
+
+    return {
+        "order_id": order_id,
+        "trace_id": tracing.trace_id_for(order_id),
+        "span_count": len(spans),
+        "settlement_latency_ms": tracing.settlement_latency_ms(spans),
+        "spans": spans
+    }
@@ -6,36 +6,78 @@ from io import BytesIO
 import os
 
 from ..models import Organization, CharityGoal
+from ..utils.response_cache import response_cache
+from ..utils.storage_io import run_io
+from ..utils.singleflight import SingleFlight
+from ..utils import lanes
 
 router = APIRouter(prefix="/api", tags=["organization"])
 
+ORGANIZATION_FILE = "app/data/organization.json"
+
+# Edits to organization.json invalidate cached organization responses
+response_cache.watch(ORGANIZATION_FILE)
+
+# Concurrent identical reads share one load/aggregation; keyed by the cache
+# version so approvals and organization.json edits are never coalesced away
+reads = SingleFlight('organization')
+
 def load_organization() -> Organization:
     """Load organization data from JSON file"""
     try:
-        with open("app/data/organization.json", "r", encoding="utf-8") as f:
+        with open(ORGANIZATION_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
             return Organization(**data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load organization data: {str(e)}")
 
+async def get_organization_shared() -> Organization:
+    """load_organization() off the event loop, shared by concurrent requests"""
+    return await reads.do(('organization', response_cache.version()),
+                          lambda: run_io('load_organization', load_organization))
+
+def render_qr_png(url: str) -> bytes:
+    """PNG of a QR code pointing at `url`"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="#2C4770", back_color="white")
+    
+    # Convert to bytes
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
 @router.get("/organization")
+@lanes.normal
 async def get_organization() -> Organization:
     """Get the organization details"""
-    return load_organization()
+    return await get_organization_shared()
 
 @router.get("/organization/goal/{goal_id}")
+@lanes.normal
 async def get_goal(goal_id: str) -> CharityGoal:
     """Get specific charity goal details"""
-    org = load_organization()
+    org = await get_organization_shared()
     goal = next((g for g in org.goals if g.id == goal_id), None)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     return goal
 
 @router.get("/organization/stats")
+@lanes.background
 async def get_stats() -> Dict[str, Any]:
     """Get organization statistics"""
-    org = load_organization()
+    return await reads.do(('stats', response_cache.version()), compute_stats)
+
+async def compute_stats() -> Dict[str, Any]:
+    org = await get_organization_shared()
     total_target = sum(goal.target_amount for goal in org.goals)
     total_collected = sum(goal.collected_amount for goal in org.goals)
     
@@ -57,9 +99,10 @@ async def get_stats() -> Dict[str, Any]:
     }
 
 @router.get("/organization/qr/{goal_id}")
+@lanes.background
 async def generate_qr_code(goal_id: str) -> Response:
     """Generate QR code for a specific charity goal"""
-    org = load_organization()
+    org = await get_organization_shared()
     goal = next((g for g in org.goals if g.id == goal_id), None)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
@@ -68,25 +111,11 @@ async def generate_qr_code(goal_id: str) -> Response:
     frontend_url = os.getenv("FRONTEND_BASE_URL", "http://localhost:5173")
     donation_url = f"{frontend_url}/cel/{goal_id}"
     
-    # Create QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(donation_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="#2C4770", back_color="white")
-    
-    # Convert to bytes
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+    # Rendering is CPU-bound: runs on the background lane's executor
+    png = await run_io('render_qr', render_qr_png, donation_url)
     
     return Response(
-        content=buffer.getvalue(),
+        content=png,
         media_type="image/png",
         headers={
             "Content-Disposition": f"inline; filename=qr-{goal_id}.png"
@@ -3,21 +3,39 @@ Production-ready Fiserv payment integration
 Based on working test.html implementation
 """
 
-from fastapi import APIRouter, HTTPException, Form, Request
+from fastapi import APIRouter, HTTPException, Form, Request, Header
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
+from collections import defaultdict
 import hashlib
 import hmac
 import uuid
 import json
 import os
+import time
 import pytz
 import logging
 import base64
 from dotenv import load_dotenv
 
+from ..utils.tracing import traced, stage_span, bind_order, annotate
+from ..utils.reconciliation import pending_index, RECONCILABLE_STATUSES
+from ..utils.payment_index import payment_index
+from ..utils.payment_archive import payment_archive
+from ..utils.email_dispatcher import queue_confirmation
+from ..utils.serialization import read_json, write_json
+from ..utils.logging_setup import lazy_json
+from ..utils.response_cache import response_cache
+from ..utils.storage_io import run_io, payments_lock, BatchWriter
+from ..utils.locks import order_locks, StoreLock
+from ..utils.idempotency import IdempotencyCache, request_keys, donor_identity
+from ..utils.payment_snapshot import SUCCESS_STATUSES
+from ..utils import lanes
+from ..utils.singleflight import SingleFlight
+from ..utils.metrics import WEBHOOK_OUTCOMES, WEBHOOK_DUPLICATES, RATE_LIMIT_REJECTIONS
+
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 
 # Setup logging
@@ -34,21 +52,174 @@ FISERV_CONFIG = {
     'hash_algorithm': 'HMACSHA256'
 }
 
+# Per client IP + donor e-mail; same variables as the hardened router
+RATE_LIMIT_CONFIG = {
+    'max_requests_per_minute': int(os.getenv('RATE_LIMIT_PER_MINUTE', '10')),
+    'max_requests_per_hour': int(os.getenv('RATE_LIMIT_PER_HOUR', '100')),
+}
+
 # Storage
 PAYMENTS_FILE = "data/payments.json"
+WEBHOOK_LOG_FILE = 'data/webhook_log.json'
 os.makedirs(os.path.dirname(PAYMENTS_FILE), exist_ok=True)
 
 def load_payments():
     """Load payments from JSON file"""
-    if os.path.exists(PAYMENTS_FILE):
-        with open(PAYMENTS_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    return read_json(PAYMENTS_FILE, default=[])
 
 def save_payments(payments):
     """Save payments to JSON file"""
-    with open(PAYMENTS_FILE, 'w') as f:
-        json.dump(payments, f, indent=2)
+    write_json(PAYMENTS_FILE, payments)
+
+# Concurrent initiates and notifications share one load/save of the store
+payments_writer = BatchWriter('payments', load_payments, save_payments, payments_lock)
+
+# Rate limiting storage: identifier -> request timestamps of the last hour
+rate_limit_storage: Dict[str, List[float]] = defaultdict(list)
+
+def check_rate_limit(identifier: str) -> bool:
+    """True if the request is within the rate limits (and is counted), False if rejected"""
+    current_time = time.time()
+    timestamps = [t for t in rate_limit_storage[identifier] if current_time - t < 3600]
+    rate_limit_storage[identifier] = timestamps
+    if (sum(1 for t in timestamps if current_time - t < 60) >= RATE_LIMIT_CONFIG['max_requests_per_minute']
+            or len(timestamps) >= RATE_LIMIT_CONFIG['max_requests_per_hour']):
+        return False
+    timestamps.append(current_time)
+    return True
+
+def find_payment(order_id: str) -> Optional[Dict]:
+    """The stored record of one order, or None"""
+    return _find_orders(load_payments(), {order_id}).get(order_id)
+
+def is_duplicate_notification(payment: Optional[Dict], input_data: Dict) -> bool:
+    """A gateway retry of a notification already applied: same transaction, same status"""
+    transaction_id = input_data.get('ipgTransactionId')
+    return (payment is not None and bool(transaction_id)
+            and payment.get('transaction_id') == transaction_id
+            and payment.get('status') == (input_data.get('status') or '').lower())
+
+def apply_payment_status(payment: dict, input_data: dict) -> Optional[str]:
+    """
+    Apply one gateway notification (S2S webhook or reconciliation result) to
+    a payment record; returns the previous status. Side effects (emails,
+    pending index) run in apply_status_updates once the change is saved.
+    """
+    order_id = payment.get('order_id')
+    status = (input_data.get('status') or '').upper()
+    previous_status = payment.get('status')
+    approval_code = input_data.get('approval_code')
+    fail_reason = input_data.get('fail_reason')
+    
+    payment['status'] = status.lower() if status else 'unknown'
+    payment['webhook_received'] = datetime.now().isoformat()
+    payment['transaction_id'] = input_data.get('ipgTransactionId')
+    
+    if status == 'APPROVED':
+        payment['approval_code'] = approval_code
+        payment['payment_completed'] = True
+        logger.info("Payment APPROVED: %s, approval: %s", order_id, approval_code)
+        
+    elif status == 'DECLINED':
+        payment['fail_reason'] = fail_reason
+        payment['payment_completed'] = False
+        logger.info("Payment DECLINED: %s, reason: %s", order_id, fail_reason)
+        
+    elif status == 'FAILED':
+        payment['fail_reason'] = fail_reason or 'Transaction failed'
+        payment['payment_completed'] = False
+        logger.info("Payment FAILED: %s", order_id)
+        
+    elif status == 'EXPIRED':
+        payment['fail_reason'] = fail_reason or 'Payment abandoned'
+        payment['payment_completed'] = False
+        logger.info("Payment EXPIRED: %s", order_id)
+    
+    return previous_status
+
+def _find_orders(payments: List[Dict], order_ids: set) -> Dict[str, Dict]:
+    """Newest first: notifications are for recent orders, so this rarely scans far"""
+    found = {}
+    for payment in reversed(payments):
+        order_id = payment.get('order_id')
+        if order_id in order_ids and order_id not in found:
+            found[order_id] = payment
+            if len(found) == len(order_ids):
+                break
+    return found
+
+def _apply_updates(payments: List[Dict], updates: List[Dict],
+                   only_from: Optional[Tuple[str, ...]] = None) -> List[Tuple[Dict, Optional[str]]]:
+    """
+    Apply notifications to the loaded store in place; returns (payment,
+    previous status) pairs. With only_from, records whose stored status is
+    no longer one of those (settled meanwhile) are left alone.
+    """
+    by_order = _find_orders(payments, {input_data.get('oid') for input_data in updates})
+    updated = []
+    for input_data in updates:
+        order_id = input_data.get('oid')
+        payment = by_order.get(order_id)
+        if payment is None:
+            logger.warning("Order not found: %s", order_id)
+            continue
+        if only_from is not None and payment.get('status') not in only_from:
+            logger.info("Order %s is already %s, update skipped", order_id, payment.get('status'))
+            continue
+        updated.append((payment, apply_payment_status(payment, input_data)))
+    return updated
+
+async def apply_status_updates(updates: List[Dict], handler: str = 's2s_webhook',
+                               only_from: Optional[Tuple[str, ...]] = None) -> List[str]:
+    """
+    Apply a batch of gateway notifications to the store (group-committed
+    with concurrent writers). Callers hold order_locks for the orders
+    involved. Returns the order IDs that were found and updated.
+    """
+    with stage_span(handler, 'storage_save'):
+        changes = await payments_writer.submit(lambda payments: _apply_updates(payments, updates, only_from))
+    # Side effects once the new statuses are saved, on the event loop
+    for payment, previous_status in changes:
+        if payment['status'] not in ('pending', 'waiting'):
+            pending_index.discard(payment.get('order_id'))
+        if payment['status'] == 'approved' and previous_status != 'approved':
+            await queue_confirmation(payment)
+    updated = [payment for payment, _ in changes]
+    if updated:
+        payment_index.record_write(updated)
+        if any(payment.get('status') in SUCCESS_STATUSES for payment in updated):
+            # Collected amounts changed
+            response_cache.invalidate('payment_approved')
+    return [payment.get('order_id') for payment in updated]
+
+async def reconcile_status_updates(updates: List[Dict]) -> List[str]:
+    """
+    Reconciler entry point: same path as the S2S webhook, under the same order
+    locks. The gateway was asked before the locks were taken, so only orders
+    still pending in the store (re-read inside the commit) are updated.
+    """
+    async with order_locks.hold_many(input_data.get('oid') for input_data in updates):
+        return await apply_status_updates(updates, handler='reconcile', only_from=RECONCILABLE_STATUSES)
+
+def load_webhook_log() -> List[Dict]:
+    if os.path.exists(WEBHOOK_LOG_FILE):
+        with open(WEBHOOK_LOG_FILE, 'r') as f:
+            return json.load(f)
+    return []
+
+def save_webhook_log(logs: List[Dict]) -> None:
+    with open(WEBHOOK_LOG_FILE, 'w') as f:
+        json.dump(logs, f, indent=2)
+
+webhook_log_writer = BatchWriter('webhook_log', load_webhook_log, save_webhook_log, StoreLock(WEBHOOK_LOG_FILE))
+
+async def append_webhook_log(entry: Dict, keep: Optional[int] = None) -> None:
+    """Add an entry to the debug webhook log (keeping only the last `keep`)"""
+    def append(logs: List[Dict]) -> None:
+        logs.append(entry)
+        if keep:
+            del logs[:-keep]
+    await webhook_log_writer.submit(append)
 
 def generate_fiserv_hash(params: dict, shared_secret: str) -> str:
     """
@@ -69,8 +240,8 @@ def generate_fiserv_hash(params: dict, shared_secret: str) -> str:
     values = [str(params_to_hash[key]) for key in sorted_keys]
     data_to_sign = '|'.join(values)
     
-    logger.info(f"Sorted keys ({len(sorted_keys)} fields): {sorted_keys}")
-    logger.info(f"Data to sign: {data_to_sign[:100]}..." if len(data_to_sign) > 100 else f"Data to sign: {data_to_sign}")
+    logger.debug("Sorted keys (%d fields): %s", len(sorted_keys), sorted_keys)
+    logger.debug("Data to sign: %.100s", data_to_sign)
     
     # Generate HMAC-SHA256
     signature = hmac.new(
@@ -82,7 +253,7 @@ def generate_fiserv_hash(params: dict, shared_secret: str) -> str:
     # Encode as Base64 (like in test.html) - CRITICAL: Must be Base64, not hex
     base64_hash = base64.b64encode(signature).decode('utf-8')
     
-    logger.info(f"Generated Base64 hash: {base64_hash}")
+    logger.debug("Generated Base64 hash: %.20s...", base64_hash)
     
     return base64_hash
 
@@ -96,15 +267,52 @@ class InitiatePaymentRequest(BaseModel):
     is_anonymous: bool = False
     organization_id: str
 
+# Double-tapped donate buttons: repeats get the first response
+initiate_requests = IdempotencyCache('initiate')
+
 @router.post("/initiate")
-async def initiate_payment(request: InitiatePaymentRequest):
-    """Initiate payment with Fiserv - production ready"""
+@lanes.critical
+@traced("payment.initiate")
+async def initiate_payment(request: InitiatePaymentRequest, req: Request,
+                           idempotency_key: Optional[str] = Header(None)):
+    """Initiate payment with Fiserv - production ready (idempotent per Idempotency-Key)"""
+    client_ip = req.client.host if req.client else "unknown"
+    with stage_span('initiate', 'idempotency_check'):
+        keys = request_keys(
+            idempotency_key,
+            client_ip,
+            (request.goal_id, request.amount, request.donor_name, request.donor_email,
+             request.message, request.is_anonymous, request.organization_id),
+            donor_identity(request.donor_email, request.donor_name, request.is_anonymous),
+        )
+    if keys is None:
+        return await _initiate_payment(request, client_ip)
+    key, aliases, request_fingerprint = keys
+    # Replays and coalesced repeats don't count against the rate limit
+    response = await initiate_requests.run(
+        key, lambda: _initiate_payment(request, client_ip), request_fingerprint, aliases,
+        # Replay only while the donor can still complete that order
+        still_valid=lambda response: response['order_id'] in pending_index,
+    )
+    bind_order(response['order_id'])
+    return response
+
+async def _initiate_payment(request: InitiatePaymentRequest, client_ip: str):
+    """Rate-limit, sign the gateway form and store the pending payment"""
+    rate_limit_id = f"{client_ip}:{request.donor_email or 'anonymous'}"
+    if not check_rate_limit(rate_limit_id):
+        RATE_LIMIT_REJECTIONS.inc()
+        logger.warning("Rate limit exceeded for %s", rate_limit_id)
+        raise HTTPException(status_code=429, detail="Too many payment requests. Please try again later.")
+
     try:
-        logger.info(f"Payment initiation request: {request.dict()}")
+        logger.info("Payment initiation request: goal=%s, amount=%s, org=%s",
+                    request.goal_id, request.amount, request.organization_id)
         
         # Generate unique order ID
         payment_id = str(uuid.uuid4())
         order_id = f"ORD-{datetime.now().strftime('%Y%m%d')}-{payment_id[:8]}"
+        bind_order(order_id)
         
         # Format amount with 2 decimal places
         amount_str = f"{float(request.amount):.2f}"
@@ -146,7 +354,8 @@ async def initiate_payment(request: InitiatePaymentRequest):
         
         # NOW generate hash with ALL fields that will be sent
         # The hash MUST include every field in form_params
-        hash_value = generate_fiserv_hash(form_params, FISERV_CONFIG['shared_secret'])
+        with stage_span('initiate', 'hash_generation'):
+            hash_value = generate_fiserv_hash(form_params, FISERV_CONFIG['shared_secret'])
         
         # Add hash to form data as 'hashExtended' AFTER generating it
         form_params['hashExtended'] = hash_value
@@ -168,13 +377,13 @@ async def initiate_payment(request: InitiatePaymentRequest):
         }
         
         # Save payment
-        payments = load_payments()
-        payments.append(payment)
-        save_payments(payments)
+        with stage_span('initiate', 'storage_save'):
+            await payments_writer.submit(lambda payments: payments.append(payment))
+        pending_index.add(order_id, payment['created_at'])
+        payment_index.record_write([payment])
         
-        logger.info(f"Payment initiated: {payment_id}")
-        logger.info(f"Order ID: {order_id}")
-        logger.info(f"Form params keys: {list(form_params.keys())}")
+        logger.info("Payment initiated: %s / %s", payment_id, order_id)
+        logger.debug("Form params keys: %s", list(form_params))
         
         # Return form data for frontend to submit
         return {
@@ -185,10 +394,12 @@ async def initiate_payment(request: InitiatePaymentRequest):
         }
         
     except Exception as e:
-        logger.error(f"Payment initiation error: {str(e)}", exc_info=True)
+        logger.error("Payment initiation error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Payment initiation failed: {str(e)}")
 
 @router.post("/webhooks/fiserv/s2s")
+@lanes.critical
+@traced("payment.s2s_webhook")
 async def handle_fiserv_s2s_webhook(request: Request):
     """
     Handle S2S webhook from Fiserv
@@ -199,55 +410,39 @@ async def handle_fiserv_s2s_webhook(request: Request):
         form_data = await request.form()
         input_data = dict(form_data)
         
-        logger.info(f"S2S Webhook received: {input_data}")
+        logger.info("S2S Webhook received: order=%s, status=%s", input_data.get('oid'), input_data.get('status'))
+        logger.debug("S2S Webhook payload: %s", lazy_json(input_data))
         
         # Extract key fields
         order_id = input_data.get('oid')
         status = input_data.get('status', '').upper()
-        approval_code = input_data.get('approval_code')
-        transaction_id = input_data.get('ipgTransactionId')
-        fail_reason = input_data.get('fail_reason')
+        bind_order(order_id)
+        annotate('status', status)
         
         # Verify signature if provided
         received_hash = input_data.get('response_hash') or input_data.get('notification_hash')
         if received_hash:
             # Verify hash (implement verification logic)
-            logger.info(f"Hash verification required for order {order_id}")
+            logger.info("Hash verification required for order %s", order_id)
             # TODO: Implement hash verification
         
-        # Update payment status
-        payments = load_payments()
-        payment_updated = False
-        
-        for payment in payments:
-            if payment.get('order_id') == order_id:
-                payment['status'] = status.lower() if status else 'unknown'
-                payment['webhook_received'] = datetime.now().isoformat()
-                payment['transaction_id'] = transaction_id
-                
-                if status == 'APPROVED':
-                    payment['approval_code'] = approval_code
-                    payment['payment_completed'] = True
-                    logger.info(f"Payment APPROVED: {order_id}, approval: {approval_code}")
-                    
-                elif status == 'DECLINED':
-                    payment['fail_reason'] = fail_reason
-                    payment['payment_completed'] = False
-                    logger.info(f"Payment DECLINED: {order_id}, reason: {fail_reason}")
-                    
-                elif status == 'FAILED':
-                    payment['fail_reason'] = fail_reason or 'Transaction failed'
-                    payment['payment_completed'] = False
-                    logger.info(f"Payment FAILED: {order_id}")
-                    
-                payment_updated = True
-                break
-        
-        if payment_updated:
-            save_payments(payments)
-            logger.info(f"Payment status updated for order: {order_id}")
+        # Update payment status (one notification per order at a time)
+        async with order_locks.hold(order_id):
+            with stage_span('s2s_webhook', 'storage_load'):
+                payment = await run_io('load_payments', find_payment, order_id)
+            with stage_span('s2s_webhook', 'idempotency_check'):
+                duplicate = is_duplicate_notification(payment, input_data)
+            if duplicate:
+                WEBHOOK_DUPLICATES.inc()
+                annotate('duplicate', True)
+                logger.info("Webhook already processed for order %s, skipping", order_id)
+                return JSONResponse(status_code=200, content={"status": "OK", "message": "Already processed"})
+            updated = await apply_status_updates([input_data])
+        if updated:
+            WEBHOOK_OUTCOMES.inc(status.lower() if status in ('APPROVED', 'DECLINED', 'FAILED') else 'other')
+            logger.info("Payment status updated for order: %s", order_id)
         else:
-            logger.warning(f"Order not found: {order_id}")
+            WEBHOOK_OUTCOMES.inc('order_not_found')
         
         # Log all webhook data for debugging
         webhook_log = {
@@ -258,21 +453,13 @@ async def handle_fiserv_s2s_webhook(request: Request):
         }
         
         # Save webhook log
-        log_file = 'data/webhook_log.json'
         try:
-            if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    logs = json.load(f)
-            else:
-                logs = []
-            logs.append(webhook_log)
-            with open(log_file, 'w') as f:
-                json.dump(logs, f, indent=2)
+            await append_webhook_log(webhook_log)
         except Exception as e:
-            logger.error(f"Failed to save webhook log: {e}")
+            logger.error("Failed to save webhook log: %s", e)
         
     except Exception as e:
-        logger.error(f"S2S webhook error: {str(e)}", exc_info=True)
+        logger.error("S2S webhook error: %s", e, exc_info=True)
     
     # ALWAYS return 200 OK to prevent Fiserv retries
     return JSONResponse(
@@ -281,30 +468,62 @@ async def handle_fiserv_s2s_webhook(request: Request):
     )
 
 @router.get("/status/{payment_id}")
+@lanes.critical
+@traced("payment.status_poll")
 async def get_payment_status(payment_id: str):
     """Get payment status by payment ID"""
-    payments = load_payments()
+    payments = await run_io('load_payments', load_payments)
     for payment in payments:
         if payment['payment_id'] == payment_id:
+            bind_order(payment['order_id'])
             return payment
+    # Settled payments older than ARCHIVE_AFTER_DAYS live in the archive
+    payment = await run_io('archive_lookup', payment_archive.find_by_payment, payment_id)
+    if payment:
+        bind_order(payment['order_id'])
+        return payment
     raise HTTPException(status_code=404, detail="Payment not found")
 
 @router.get("/order-status/{order_id}")
+@lanes.critical
+@traced("payment.status_poll")
 async def get_order_status(order_id: str):
     """Get payment status by order ID"""
-    payments = load_payments()
-    for payment in payments:
-        if payment['order_id'] == order_id:
-            return {
-                'order_id': order_id,
-                'status': payment.get('status', 'pending'),
-                'payment_completed': payment.get('payment_completed', False),
-                'amount': payment.get('amount'),
-                'created_at': payment.get('created_at')
-            }
+    payments = await run_io('load_payments', load_payments)
+    payment = next((p for p in payments if p['order_id'] == order_id), None)
+    if payment is None:
+        payment = await run_io('archive_lookup', payment_archive.find_by_order, order_id)
+    if payment:
+        bind_order(order_id)
+        annotate('status', payment.get('status', 'pending'))
+        return {
+            'order_id': order_id,
+            'status': payment.get('status', 'pending'),
+            'payment_completed': payment.get('payment_completed', False),
+            'amount': payment.get('amount'),
+            'created_at': payment.get('created_at')
+        }
     raise HTTPException(status_code=404, detail="Order not found")
 
+# Monitoring dashboards poll together: one aggregation per burst
+stats_reads = SingleFlight('payment_stats')
+
+async def compute_payment_statistics() -> Dict:
+    # Vectorized over the in-memory payment columns instead of scanning dicts
+    await payment_index.refresh()
+    return {
+        **payment_index.aggregates.summary(),
+        'last_update': datetime.now().isoformat()
+    }
+
+@router.get("/stats")
+@lanes.background
+async def get_payment_statistics():
+    """Get payment statistics for monitoring"""
+    return await stats_reads.do(('summary', response_cache.version()), compute_payment_statistics)
+
 @router.get("/test-hash")
+@lanes.background
 async def test_hash_generation():
     """Test endpoint to verify hash generation matches test.html"""
     test_params = {
@@ -16,6 +16,8 @@ from pathlib import Path
 
 from ..models import PaymentRequest, Payment, PaymentStatus
 from ..utils.fiserv_security import FiservSecurity, FISERV_IP_WHITELIST
+from ..utils.email_dispatcher import email_dispatcher, confirmation_email
+from ..utils.webhook_store import webhook_payloads
 
 logger = logging.getLogger(__name__)
 
@@ -236,6 +238,9 @@ async def handle_s2s_notification(
         else:
             payment_status = 'pending'
         
+        # Full params go to the side store; the payment keeps a reference
+        payload_id = webhook_payloads.put(params, order_id)
+        
         # Update payment record
         payment_update = {
             'status': payment_status,
@@ -244,7 +249,7 @@ async def handle_s2s_notification(
             'approval_code': approval_code,
             'fail_reason': fail_reason,
             'processed_at': datetime.now().isoformat(),
-            'last_s2s_notification': params
+            'last_s2s_notification_id': payload_id
         }
         
         # Find and update payment by order_id
@@ -261,7 +266,7 @@ async def handle_s2s_notification(
                     'timestamp': datetime.now().isoformat(),
                     'status': status,
                     'transaction_id': transaction_id,
-                    'params': params
+                    'payload_id': payload_id
                 })
                 
                 # Update payment fields
@@ -279,7 +284,9 @@ async def handle_s2s_notification(
                 background_tasks.add_task(
                     send_payment_confirmation,
                     order_id,
-                    params.get('bmail')
+                    params.get('bmail') or payment.get('donor_email'),
+                    payment.get('amount', 0),
+                    None if payment.get('is_anonymous') else payment.get('donor_name')
                 )
         else:
             logger.error(f"Payment not found for order: {order_id}")
@@ -349,19 +356,22 @@ def get_status_message(status: str) -> str:
     }
     return messages.get(status, 'Status płatności nieznany')
 
-async def send_payment_confirmation(order_id: str, email: Optional[str]):
+async def send_payment_confirmation(order_id: str, email: Optional[str], amount: float = 0,
+                                    donor_name: Optional[str] = None):
     """
-    Background task to send payment confirmation email
+    Background task to queue the payment confirmation email.
+    The message is persisted to the outbox and sent by the email dispatcher,
+    so SMTP latency never runs in the request worker and survives restarts.
     """
     if not email:
         return
     
     try:
-        # In production: implement actual email sending
-        logger.info(f"Would send confirmation email for order {order_id} to {email}")
-        # Example: use SendGrid, AWS SES, etc.
+        content = confirmation_email(order_id, amount, donor_name)
+        await email_dispatcher.enqueue(email, content['subject'], content['body'])
+        logger.info(f"Queued confirmation email for order {order_id} to {email}")
     except Exception as e:
-        logger.error(f"Failed to send confirmation email: {str(e)}")
+        logger.error(f"Failed to queue confirmation email: {str(e)}")
 
 # Health check endpoint for monitoring
 @router.get("/health")
@@ -0,0 +1,184 @@
+"""
+Admission control and load shedding
+Every request is classified by path into a route class. Each class has a
+concurrency limit; requests over the limit wait in a short FIFO queue and
+are rejected with 503 + Retry-After once the queue is full or they have
+waited longer than the class allows. Rejecting early keeps the worker busy
+with requests that will still be useful when they finish, instead of
+completing payments for donors whose browsers already timed out.
+
+    webhook  S2S notifications           never shed (Fiserv retries are costly)
+    payment  initiate, status polls      generous limits
+    read     organization, bootstrap,     shed first
+             stats, QR
+
+Paths outside these classes (health, metrics, admin, assets) are not
+limited.
+"""
+
+import os
+import re
+import time
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from .metrics import registry
+
+
+def _class_config(name: str, max_in_flight: int, max_queue: int, max_wait_ms: int) -> Dict:
+    prefix = f"ADMISSION_{name.upper()}"
+    return {
+        'max_in_flight': int(os.getenv(f'{prefix}_MAX_IN_FLIGHT', str(max_in_flight))),
+        'max_queue': int(os.getenv(f'{prefix}_MAX_QUEUE', str(max_queue))),
+        'max_wait_seconds': int(os.getenv(f'{prefix}_MAX_WAIT_MS', str(max_wait_ms))) / 1000,
+    }
+
+
+ADMISSION_CONFIG = {
+    'enabled': os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true',
+    'retry_after_seconds': int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', '5')),
+    'classes': {
+        'payment': _class_config('payment', 64, 256, 2000),
+        'read': _class_config('read', 32, 64, 250),
+    },
+}
+
+# First match wins
+ROUTE_CLASSES = (
+    ('webhook', re.compile(r'^/api/payments/webhooks/')),
+    ('read', re.compile(r'^/(api/(organization|bootstrap)(/.*)?|api/payments/stats)?$')),
+    ('payment', re.compile(r'^/api/payments/(initiate|status/|order-status/)')),
+)
+
+ADMITTED = registry.counter(
+    "admission_admitted_total",
+    "Requests admitted, by route class",
+    ("route_class",),
+)
+REJECTED = registry.counter(
+    "admission_rejected_total",
+    "Requests shed with 503, by route class and reason (queue_full, timeout)",
+    ("route_class", "reason"),
+)
+IN_FLIGHT = registry.gauge(
+    "admission_in_flight",
+    "Requests being handled, by route class",
+    ("route_class",),
+)
+QUEUED = registry.gauge(
+    "admission_queued",
+    "Requests waiting for admission, by route class",
+    ("route_class",),
+)
+QUEUE_DELAY = registry.histogram(
+    "admission_queue_delay_seconds",
+    "Time admitted requests waited for a slot, by route class",
+    ("route_class",),
+)
+
+
+def classify(path: str) -> Optional[str]:
+    for name, pattern in ROUTE_CLASSES:
+        if pattern.match(path):
+            return name
+    return None
+
+
+class RouteClass:
+    """Concurrency limit with a bounded FIFO wait; limit None admits everything"""
+
+    def __init__(self, name: str, config: Optional[Dict] = None):
+        self.name = name
+        self.config = config
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _admitted(self, waited: float) -> None:
+        ADMITTED.inc(self.name)
+        QUEUE_DELAY.observe(waited, self.name)
+        IN_FLIGHT.set(self.in_flight, self.name)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None when admitted, else the rejection reason"""
+        if self.config is None or self.in_flight < self.config['max_in_flight']:
+            self.in_flight += 1
+            self._admitted(0.0)
+            return None
+        if len(self._waiters) >= self.config['max_queue']:
+            REJECTED.inc(self.name, 'queue_full')
+            return 'queue_full'
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        QUEUED.set(len(self._waiters), self.name)
+        start = time.perf_counter()
+        try:
+            # shield: on timeout the future stays intact, so a slot handed over
+            # at the last moment is noticed below rather than leaked
+            await asyncio.wait_for(asyncio.shield(waiter), self.config['max_wait_seconds'])
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled: pass it on
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            QUEUED.set(len(self._waiters), self.name)
+        if waiter.cancelled():
+            REJECTED.inc(self.name, 'timeout')
+            return 'timeout'
+        # release() handed its slot to us; in_flight already counts it
+        self._admitted(time.perf_counter() - start)
+        return None
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        IN_FLIGHT.set(self.in_flight, self.name)
+
+
+class AdmissionController:
+
+    def __init__(self, config: Dict = ADMISSION_CONFIG):
+        self.config = config
+        self.classes = {
+            'webhook': RouteClass('webhook'),
+            **{name: RouteClass(name, limits) for name, limits in config['classes'].items()},
+        }
+
+    def overloaded(self, reason: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content={'detail': 'Server is busy, please retry shortly', 'reason': reason},
+            headers={'Retry-After': str(self.config['retry_after_seconds'])},
+        )
+
+    async def middleware(self, request: Request, call_next):
+        """HTTP middleware: admit, queue briefly or shed, per route class"""
+        name = classify(request.url.path) if self.config['enabled'] else None
+        if name is None:
+            return await call_next(request)
+        route_class = self.classes[name]
+        reason = await route_class.acquire()
+        if reason is not None:
+            return self.overloaded(reason)
+        try:
+            return await call_next(request)
+        finally:
+            route_class.release()
+
+
+# Create singleton instance
+admission = AdmissionController()
@@ -0,0 +1,381 @@
+"""
+Responsive, precompressed static assets
+static/ holds multi-megabyte PNG/JPG backgrounds that were served at full
+size, without caching headers, to phones on mobile data. The pipeline
+builds, once per source file content:
+
+    images  resized WebP/AVIF variants (ASSET_WIDTHS, never upscaled) plus a
+            copy of the original, all with content-hashed names (variants
+            also hash the width/format/quality options)
+    text    a content-hashed copy with .gz/.br variants
+
+into ASSET_BUILD_DIR with a manifest.json. Unchanged sources are skipped,
+so a rebuild at startup costs only a hash per file; outputs of deleted or
+changed sources are removed.
+
+AssetFiles (mounted at /assets) serves:
+    /assets/<hashed name>       immutable, cacheable for a year
+    /assets/<original name>     the best variant the Accept header allows
+                                (avif/webp, else the original) at the smallest
+                                width >= ?w= (default: largest), Vary: Accept
+    /assets/manifest.json       logical name -> hashed variants
+Text assets are sent precompressed when Accept-Encoding allows. Anything
+not in the manifest (build still running) falls back to the plain file.
+
+Build ahead of deployment (from the backend directory):
+    python -m app.utils.assets
+"""
+
+import os
+import re
+import time
+import shutil
+import asyncio
+import json
+import hashlib
+import logging
+import mimetypes
+import argparse
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .metrics import registry
+from .compression import precompress, SUFFIXES, ENCODINGS
+from .serialization import read_json, write_json
+from .storage_io import run_io
+from . import lanes
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional dependency, images are only copied without it
+    Image = None
+    features = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP'}
+
+
+def _supported_formats(names: List[str]) -> List[str]:
+    if features is None:
+        return []
+    return [name for name in names if name in IMAGE_FORMATS and features.check(name)]
+
+
+ASSET_CONFIG = {
+    'source_dir': os.getenv('ASSET_SOURCE_DIR', 'static'),
+    'build_dir': os.getenv('ASSET_BUILD_DIR', 'build/assets'),
+    'build_on_startup': os.getenv('ASSET_BUILD_ON_STARTUP', 'true').lower() == 'true',
+    'widths': [int(w) for w in os.getenv('ASSET_WIDTHS', '480,960,1920').split(',')],
+    # Preference order; formats this Pillow build can't encode are dropped
+    'formats': _supported_formats(os.getenv('ASSET_FORMATS', 'avif,webp').split(',')),
+    'avif_quality': int(os.getenv('ASSET_AVIF_QUALITY', '55')),
+    'webp_quality': int(os.getenv('ASSET_WEBP_QUALITY', '78')),
+    # Cache lifetime of negotiated (unhashed) URLs; hashed ones are immutable
+    'max_age': int(os.getenv('ASSET_MAX_AGE_SECONDS', '86400')),
+}
+
+IMAGE_EXTENSIONS = {'.png': 'png', '.jpg': 'jpeg', '.jpeg': 'jpeg'}
+TEXT_EXTENSIONS = {'.css', '.js', '.mjs', '.svg', '.json', '.txt', '.html', '.map', '.xml'}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png', 'jpeg': 'image/jpeg'}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+MANIFEST_FILE = 'manifest.json'
+
+ASSET_RESPONSES = registry.counter(
+    "asset_responses_total",
+    "Static asset responses by variant served (avif, webp, png, jpeg, br, gzip, identity, plain)",
+    ("variant",),
+)
+ASSET_BUILD_DURATION = registry.histogram(
+    "asset_build_seconds",
+    "Time to build responsive and precompressed asset variants",
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300),
+)
+
+
+def _slug(stem: str) -> str:
+    ascii_stem = unicodedata.normalize('NFKD', stem).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', ascii_stem.lower()).strip('-') or 'asset'
+
+
+def _write_atomic(path: str, write) -> None:
+    # Hashed names are served as immutable: never expose a half-written file
+    tmp = f"{path}.tmp.{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    def write(tmp: str) -> None:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+    _write_atomic(path, write)
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """media range / coding -> q from an Accept or Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+class AssetPipeline:
+
+    def __init__(self, config: Dict = ASSET_CONFIG):
+        self.config = config
+        self.source_dir = config['source_dir']
+        self.build_dir = config['build_dir']
+        self._set_manifest(read_json(os.path.join(self.build_dir, MANIFEST_FILE), default={}))
+        self._task: Optional[asyncio.Task] = None
+
+    def _set_manifest(self, manifest: Dict[str, Dict]) -> None:
+        # One assignment each: requests on the loop never see a half-built state
+        self.hashed = {file: entry for entry in manifest.values() for file in self._entry_files(entry)}
+        self.manifest = manifest
+
+    # --- build ---------------------------------------------------------------
+
+    def _options(self) -> Dict:
+        # Part of every manifest entry: changing these rebuilds the variants
+        return {key: self.config[key] for key in ('widths', 'formats', 'avif_quality', 'webp_quality')}
+
+    def _options_digest(self) -> str:
+        return hashlib.blake2b(json.dumps(self._options(), sort_keys=True).encode(), digest_size=3).hexdigest()
+
+    def _sources(self) -> List[str]:
+        names = []
+        for directory, _, files in os.walk(self.source_dir):
+            for name in files:
+                extension = os.path.splitext(name)[1].lower()
+                if extension in IMAGE_EXTENSIONS or extension in TEXT_EXTENSIONS:
+                    names.append(os.path.relpath(os.path.join(directory, name), self.source_dir).replace(os.sep, '/'))
+        return sorted(names)
+
+    def _up_to_date(self, entry: Optional[Dict], digest: str) -> bool:
+        return (entry is not None and entry['hash'] == digest and entry.get('options') == self._options()
+                and all(os.path.exists(os.path.join(self.build_dir, f)) for f in self._entry_files(entry)))
+
+    @staticmethod
+    def _entry_files(entry: Dict) -> List[str]:
+        return [v['file'] for v in entry.get('variants', [])] + [entry['file'], *entry.get('encodings', {}).values()]
+
+    def _build_image(self, name: str, source: str, digest: str) -> Dict:
+        stem, extension = os.path.splitext(os.path.basename(name))
+        base = f"{os.path.dirname(name) + '/' if os.path.dirname(name) else ''}{_slug(stem)}"
+        original = f"{base}.{digest}{extension.lower()}"
+        _write_atomic(os.path.join(self.build_dir, original), lambda tmp: shutil.copyfile(source, tmp))
+        entry = {'type': 'image', 'file': original, 'format': IMAGE_EXTENSIONS[extension.lower()], 'variants': []}
+        if Image is None:
+            return entry
+        # Variant bytes depend on the options too; a new quality must not reuse a cached URL
+        variant_digest = f"{digest}-{self._options_digest()}"
+
+        with Image.open(source) as image:
+            image.load()
+            entry['width'], entry['height'] = image.size
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            widths = sorted({w for w in self.config['widths'] if w < image.width} | {min(image.width, max(self.config['widths']))})
+            for width in widths:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                for fmt in self.config['formats']:
+                    file = f"{base}-{width}w.{variant_digest}.{fmt}"
+                    path = os.path.join(self.build_dir, file)
+                    _write_atomic(path, lambda tmp: resized.save(tmp, IMAGE_FORMATS[fmt],
+                                                                 quality=self.config[f'{fmt}_quality']))
+                    entry['variants'].append({'file': file, 'format': fmt, 'width': width,
+                                              'bytes': os.path.getsize(path)})
+        return entry
+
+    def _build_text(self, name: str, source: str, digest: str) -> Dict:
+        stem, extension = os.path.splitext(name)
+        hashed = f"{stem}.{digest}{extension}"
+        with open(source, 'rb') as f:
+            data = f.read()
+        _write_bytes(os.path.join(self.build_dir, hashed), data)
+        encodings = {}
+        for encoding, encoded in precompress(data).items():
+            encodings[encoding] = hashed + SUFFIXES[encoding]
+            _write_bytes(os.path.join(self.build_dir, encodings[encoding]), encoded)
+        return {'type': 'text', 'file': hashed, 'encodings': encodings}
+
+    def build(self) -> Dict[str, int]:
+        """Bring the build directory up to date with the sources; blocking"""
+        start = time.perf_counter()
+        manifest, built = {}, 0
+        for name in self._sources():
+            source = os.path.join(self.source_dir, name)
+            with open(source, 'rb') as f:
+                digest = hashlib.blake2b(f.read(), digest_size=5).hexdigest()
+            entry = self.manifest.get(name)
+            if not self._up_to_date(entry, digest):
+                os.makedirs(os.path.join(self.build_dir, os.path.dirname(name)), exist_ok=True)
+                kind = 'image' if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS else 'text'
+                entry = (self._build_image if kind == 'image' else self._build_text)(name, source, digest)
+                entry.update(hash=digest, options=self._options())
+                built += 1
+            manifest[name] = entry
+
+        # Outputs of deleted or changed sources
+        keep = {f for entry in manifest.values() for f in self._entry_files(entry)} | {MANIFEST_FILE}
+        removed = 0
+        for directory, _, files in os.walk(self.build_dir):
+            for file in files:
+                relative = os.path.relpath(os.path.join(directory, file), self.build_dir).replace(os.sep, '/')
+                # '.tmp.': another worker's write in progress
+                if relative not in keep and '.tmp.' not in file:
+                    os.remove(os.path.join(directory, file))
+                    removed += 1
+
+        write_json(os.path.join(self.build_dir, MANIFEST_FILE), manifest)
+        self._set_manifest(manifest)
+        ASSET_BUILD_DURATION.observe(time.perf_counter() - start)
+        return {'assets': len(manifest), 'built': built, 'removed': removed}
+
+    async def run_build(self) -> None:
+        # Image encoding is CPU-heavy: background lane pool, off the storage threads
+        lanes.current_lane.set(lanes.background)
+        try:
+            summary = await run_io('asset_build', self.build)
+            logger.info("Asset build: %s", summary, extra={'assets': summary})
+        except Exception as e:
+            logger.error("Asset build failed: %s", e, exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_build())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            # The build thread can't be interrupted; let it finish its file
+            await asyncio.wait([self._task], timeout=1)
+        self._task = None
+
+    # --- serving -------------------------------------------------------------
+
+    def negotiate_image(self, entry: Dict, accept: Optional[str], width: Optional[int]) -> Tuple[str, str]:
+        """
+        (file, format) for an Accept header and requested width: per accepted
+        format the smallest variant at least `width` wide (default: the
+        largest), then whichever of those is the smallest file
+        """
+        accepted = _accepted(accept)
+        candidates = []
+        for fmt in self.config['formats']:
+            if accepted.get(f'image/{fmt}', 0) <= 0:
+                continue
+            variants = sorted((v for v in entry['variants'] if v['format'] == fmt), key=lambda v: v['width'])
+            if not variants:
+                continue
+            fitting = [v for v in variants if width is not None and v['width'] >= width]
+            candidates.append(fitting[0] if fitting else variants[-1])
+        if not candidates:
+            return entry['file'], entry['format']
+        best = min(candidates, key=lambda v: (v['bytes'], self.config['formats'].index(v['format'])))
+        return best['file'], best['format']
+
+    def negotiate_encoding(self, entry: Dict, file: str, accept_encoding: Optional[str]) -> Tuple[str, Optional[str]]:
+        accepted = _accepted(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in entry.get('encodings', {}) and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return entry['encodings'][encoding], encoding
+        return file, None
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles serving built variants (immutable or negotiated) before the plain files"""
+
+    def __init__(self, *args, pipeline: AssetPipeline, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pipeline = pipeline
+
+    def _file(self, scope, file: str, media_type: Optional[str], headers: Dict[str, str]) -> Response:
+        full_path = os.path.join(self.pipeline.build_dir, file)
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            raise HTTPException(status_code=404)
+        response = FileResponse(full_path, stat_result=stat_result, method=scope['method'],
+                                media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    async def get_response(self, path: str, scope) -> Response:
+        if scope['method'] not in ('GET', 'HEAD'):
+            raise HTTPException(status_code=405)
+        request_headers = Headers(scope=scope)
+        path = path.replace(os.sep, '/')
+
+        if path == MANIFEST_FILE:
+            ASSET_RESPONSES.inc('manifest')
+            return self._file(scope, MANIFEST_FILE, 'application/json', {'Cache-Control': 'no-cache'})
+
+        entry = self.pipeline.hashed.get(path)
+        if entry is not None:
+            headers = {'Cache-Control': IMMUTABLE}
+            if entry['type'] == 'text' and path == entry['file']:
+                return self._text(scope, entry, request_headers, headers)
+            ASSET_RESPONSES.inc('hashed')
+            return self._file(scope, path, None, headers)
+
+        entry = self.pipeline.manifest.get(path)
+        if entry is not None:
+            headers = {'Cache-Control': f"public, max-age={self.pipeline.config['max_age']}"}
+            if entry['type'] == 'text':
+                return self._text(scope, entry, request_headers, headers)
+            requested = QueryParams(scope.get('query_string', b'')).get('w', '')
+            width = int(requested) if requested.isdigit() else None
+            file, fmt = self.pipeline.negotiate_image(entry, request_headers.get('accept'), width)
+            headers['Vary'] = 'Accept'
+            ASSET_RESPONSES.inc(fmt)
+            return self._file(scope, file, MIME_TYPES[fmt], headers)
+
+        ASSET_RESPONSES.inc('plain')
+        return await super().get_response(path, scope)
+
+    def _text(self, scope, entry: Dict, request_headers: Headers, headers: Dict[str, str]) -> Response:
+        file, encoding = self.pipeline.negotiate_encoding(entry, entry['file'], request_headers.get('accept-encoding'))
+        headers['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        ASSET_RESPONSES.inc(encoding or 'identity')
+        return self._file(scope, file, mimetypes.guess_type(entry['file'])[0], headers)
+
+
+# Create singleton instance
+asset_pipeline = AssetPipeline()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build responsive and precompressed asset variants")
+    parser.add_argument('--source', default=ASSET_CONFIG['source_dir'])
+    parser.add_argument('--out', default=ASSET_CONFIG['build_dir'])
+    args = parser.parse_args()
+
+    pipeline = AssetPipeline({**ASSET_CONFIG, 'source_dir': args.source, 'build_dir': args.out})
+    print(pipeline.build())
+    for name, entry in pipeline.manifest.items():
+        source_size = os.path.getsize(os.path.join(args.source, name))
+        sizes = {f"{v['format']}@{v['width']}": os.path.getsize(os.path.join(args.out, v['file']))
+                 for v in entry.get('variants', [])}
+        sizes.update({e: os.path.getsize(os.path.join(args.out, f)) for e, f in entry.get('encodings', {}).items()})
+        print(f"{name}: {source_size} bytes -> {sizes}")
@@ -0,0 +1,221 @@
+"""
+gzip / brotli response compression
+Encoders shared by the precompressed outputs (static materializer, asset
+pipeline, response cache) and an HTTP middleware for the rest of the JSON
+API. gzip output is deterministic (no timestamp in the header), so
+compressing the same bytes twice yields the same file and files that
+didn't change are not rewritten. brotli is optional: without the package
+only gzip is offered.
+
+The middleware compresses buffered responses of compressible types above
+COMPRESSION_MIN_SIZE when the client accepts it. Responses that already
+carry a Content-Encoding are left alone - in particular response cache
+entries, which keep one compressed copy per encoding and never compress the
+same body twice. Streaming responses (exports) are not buffered.
+
+CPU spent and bytes saved are counted per encoding and mode (dynamic,
+cached); stats() relates the two. Level comparison on a sample payload:
+    python -m app.utils.compression
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import argparse
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional dependency, .br variants are skipped without it
+    brotli = None
+
+COMPRESSION_CONFIG = {
+    'enabled': os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true',
+    # Smaller bodies gain less than the Content-Encoding overhead
+    'min_size': int(os.getenv('COMPRESSION_MIN_SIZE', '512')),
+    # Per-request compression: cheap levels
+    'gzip_level': int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')),
+    'brotli_quality': int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4')),
+    # Levels for output compressed once and served many times
+    'static_gzip_level': int(os.getenv('COMPRESSION_STATIC_GZIP_LEVEL', '9')),
+    'static_brotli_quality': int(os.getenv('COMPRESSION_STATIC_BROTLI_QUALITY', '11')),
+}
+
+# Preference order when a client accepts several
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# File suffix of each precompressed variant, as nginx gzip_static/brotli_static expect
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|x-ndjson|javascript|xml)|image/svg\+xml)')
+
+COMPRESSION_RESPONSES = registry.counter(
+    "compression_responses_total",
+    "Responses by content encoding applied and mode (dynamic, cached)",
+    ("encoding", "mode"),
+)
+COMPRESSION_CPU = registry.counter(
+    "compression_cpu_seconds_total",
+    "CPU time spent compressing response bodies, by encoding and mode",
+    ("encoding", "mode"),
+)
+COMPRESSION_BYTES_IN = registry.counter(
+    "compression_input_bytes_total",
+    "Uncompressed size of compressed responses sent, by encoding and mode",
+    ("encoding", "mode"),
+)
+COMPRESSION_BYTES_OUT = registry.counter(
+    "compression_output_bytes_total",
+    "Bytes sent for compressed responses, by encoding and mode",
+    ("encoding", "mode"),
+)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=COMPRESSION_CONFIG['static_gzip_level'] if level is None else level,
+                             mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=COMPRESSION_CONFIG['static_brotli_quality'] if level is None else level)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def negotiate(accept_encoding: Optional[str], available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """Preferred encoding the client accepts (q > 0), or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress_measured(data: bytes, encoding: str, mode: str, level: Optional[int] = None) -> bytes:
+    """compress() recording the CPU time it took"""
+    start = time.thread_time()
+    encoded = compress(data, encoding, level)
+    COMPRESSION_CPU.inc(encoding, mode, amount=time.thread_time() - start)
+    return encoded
+
+
+def record_response(encoding: str, mode: str, original_size: int, sent_size: int) -> None:
+    """Count one compressed response sent (cached bodies: every time, not once)"""
+    COMPRESSION_RESPONSES.inc(encoding, mode)
+    COMPRESSION_BYTES_IN.inc(encoding, mode, amount=original_size)
+    COMPRESSION_BYTES_OUT.inc(encoding, mode, amount=sent_size)
+
+
+def compressible(media_type: Optional[str], size: int) -> bool:
+    return (COMPRESSION_CONFIG['enabled'] and size >= COMPRESSION_CONFIG['min_size']
+            and bool(media_type) and COMPRESSIBLE_TYPES.match(media_type) is not None)
+
+
+def precompress(data: bytes) -> Dict[str, bytes]:
+    """Every available encoding of data at static levels, keeping only the ones that are smaller"""
+    variants = {}
+    for encoding in ENCODINGS:
+        encoded = compress(data, encoding)
+        if len(encoded) < len(data):
+            variants[encoding] = encoded
+    return variants
+
+
+def _dynamic_level(encoding: str) -> int:
+    return COMPRESSION_CONFIG['gzip_level'] if encoding == 'gzip' else COMPRESSION_CONFIG['brotli_quality']
+
+
+def add_vary(headers, value: str) -> None:
+    """Add value to the Vary header, keeping what is already there"""
+    existing = headers.get('vary')
+    if not existing:
+        headers['vary'] = value
+    elif value.lower() not in existing.lower():
+        headers['vary'] = f"{existing}, {value}"
+
+
+async def middleware(request: Request, call_next):
+    """HTTP middleware: gzip/brotli for buffered compressible responses"""
+    response = await call_next(request)
+    encoding = negotiate(request.headers.get('accept-encoding')) if COMPRESSION_CONFIG['enabled'] else None
+    length = response.headers.get('content-length')
+    if (encoding is None or request.method == 'HEAD' or 'content-encoding' in response.headers
+            or length is None or not compressible(response.headers.get('content-type'), int(length))):
+        # Unknown length = streaming (exports): not buffered
+        return response
+
+    body = b''.join([chunk async for chunk in response.body_iterator])
+    encoded = compress_measured(body, encoding, 'dynamic', _dynamic_level(encoding))
+    record_response(encoding, 'dynamic', len(body), len(encoded))
+    compressed = Response(content=encoded, status_code=response.status_code, background=response.background)
+    # Keep every original header (repeated ones too) except the length
+    compressed.raw_headers = [(k, v) for k, v in response.raw_headers if k != b'content-length'] + [
+        (b'content-length', str(len(encoded)).encode('latin-1')),
+        (b'content-encoding', encoding.encode('latin-1')),
+    ]
+    add_vary(compressed.headers, 'Accept-Encoding')
+    return compressed
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """CPU per response against bytes saved, per encoding and mode (from the Prometheus counters)"""
+    summary = {}
+    for (encoding, mode), responses in COMPRESSION_RESPONSES.samples().items():
+        cpu = COMPRESSION_CPU.value(encoding, mode)
+        saved = COMPRESSION_BYTES_IN.value(encoding, mode) - COMPRESSION_BYTES_OUT.value(encoding, mode)
+        summary[f"{encoding}/{mode}"] = {
+            'responses': responses,
+            'cpu_ms_per_response': round(cpu * 1000 / responses, 4) if responses else 0,
+            'bytes_saved_per_response': round(saved / responses) if responses else 0,
+            'bytes_saved_per_cpu_ms': round(saved / (cpu * 1000)) if cpu else 0,
+        }
+    return summary
+
+
+def benchmark(data: bytes, rounds: int = 50) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for encoding in ENCODINGS:
+        levels = range(1, 10) if encoding == 'gzip' else range(0, 12)
+        for level in levels:
+            start = time.thread_time()
+            for _ in range(rounds):
+                encoded = compress(data, encoding, level)
+            cpu_ms = (time.thread_time() - start) * 1000 / rounds
+            results[f"{encoding}-{level}"] = {'bytes': len(encoded), 'saved': len(data) - len(encoded),
+                                              'cpu_ms': round(cpu_ms, 4)}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CPU cost vs bytes saved per encoding and level")
+    parser.add_argument('file', nargs='?', help="JSON body to compress (default: a synthetic payment listing)")
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file, 'rb') as f:
+            sample = f.read()
+    else:
+        sample = json.dumps({'items': [{
+            'payment_id': f"p{i}", 'order_id': f"ORD-20250101-{i:08d}", 'goal_id': 'church',
+            'amount': 50.0, 'status': 'approved', 'created_at': '2025-01-01T12:00:00',
+        } for i in range(200)]}).encode('utf-8')
+    print(f"input: {len(sample)} bytes")
+    for name, result in benchmark(sample, args.rounds).items():
+        print(name, result)
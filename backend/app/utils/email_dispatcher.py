@@ -0,0 +1,304 @@
+"""
+Durable outbound email queue
+Confirmation emails are persisted to an outbox file before anything is sent,
+so a restart does not lose them. A background worker drains due messages in
+batches over one reused SMTP connection, retries failures with backoff and
+respects a per-provider sending rate. A refused message only costs itself an
+attempt; a lost connection charges the rest of its batch. Messages that ran
+out of attempts stay in the outbox (marked dead) for EMAIL_DEAD_RETENTION_DAYS
+so they can be inspected, then are dropped. Outbox rewrites run on the
+storage I/O pool as a locked read-merge-write, so uvicorn workers sharing
+the file keep each other's messages.
+
+Tests run the dispatcher against a local aiosmtpd sink:
+    pip install -r requirements-dev.txt
+    python -m pytest tests/test_email_dispatcher.py
+"""
+
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Set
+
+from .metrics import registry
+from .serialization import read_json, write_json
+from .storage_io import run_io
+from .locks import StoreLock
+
+try:
+    import aiosmtplib
+except ImportError:  # optional dependency, only needed when email is enabled
+    aiosmtplib = None
+
+logger = logging.getLogger(__name__)
+
+EMAIL_CONFIG = {
+    'enabled': os.getenv('EMAIL_ENABLED', 'false').lower() == 'true',
+    'smtp_host': os.getenv('SMTP_HOST', 'localhost'),
+    'smtp_port': int(os.getenv('SMTP_PORT', '1025')),
+    'smtp_username': os.getenv('SMTP_USERNAME', ''),
+    'smtp_password': os.getenv('SMTP_PASSWORD', ''),
+    'smtp_starttls': os.getenv('SMTP_STARTTLS', 'false').lower() == 'true',
+    'sender': os.getenv('EMAIL_SENDER', 'Misjonarze Tarnów <kontakt@misjonarze-tarnow.pl>'),
+    'outbox_file': os.getenv('EMAIL_OUTBOX_FILE', 'data/email_outbox.json'),
+    'batch_size': int(os.getenv('EMAIL_BATCH_SIZE', '20')),
+    'max_per_minute': int(os.getenv('EMAIL_MAX_PER_MINUTE', '60')),
+    'max_attempts': int(os.getenv('EMAIL_MAX_ATTEMPTS', '6')),
+    'backoff_base': float(os.getenv('EMAIL_BACKOFF_BASE', '30')),
+    'backoff_max': float(os.getenv('EMAIL_BACKOFF_MAX', '3600')),
+    'poll_seconds': float(os.getenv('EMAIL_POLL_SECONDS', '30')),
+    'dead_retention_seconds': float(os.getenv('EMAIL_DEAD_RETENTION_DAYS', '7')) * 86400,
+}
+
+EMAILS = registry.counter(
+    "email_messages_total",
+    "Outbound emails by outcome",
+    ("outcome",),
+)
+OUTBOX_DEPTH = registry.gauge(
+    "email_outbox_depth",
+    "Emails waiting in the outbox",
+)
+
+
+class RateLimiter:
+    """Token bucket: `rate_per_minute` sends, refilled continuously"""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = max(1, rate_per_minute)
+        self.tokens = float(self.capacity)
+        self.refill_per_second = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.refill_per_second)
+
+
+class EmailDispatcher:
+    """Persisted outbox + async SMTP sender"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = {**EMAIL_CONFIG, **(config or {})}
+        self._store_lock = StoreLock(self.config['outbox_file'])
+        self.outbox: List[Dict] = self._load_outbox()
+        # IDs sent or pruned since the last save, to drop from the file
+        self._removed: Set[str] = set()
+        # One bucket per SMTP provider (host:port)
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Keeps snapshots from being written out of order
+        self._save_lock = asyncio.Lock()
+        OUTBOX_DEPTH.set(len(self.outbox))
+
+    def _load_outbox(self) -> List[Dict]:
+        try:
+            return read_json(self.config['outbox_file'], default=[])
+        except Exception as e:
+            logger.error(f"Error loading email outbox: {e}")
+        return []
+
+    def _merge_outbox(self, snapshot: List[Dict], removed: Set[str]) -> None:
+        """Locked read-merge-write: messages other workers added to the file are kept"""
+        with self._store_lock:
+            ours = {m['id'] for m in snapshot}
+            others = [m for m in self._load_outbox() if m['id'] not in ours and m['id'] not in removed]
+            write_json(self.config['outbox_file'], others + snapshot)
+
+    async def _save_outbox(self) -> None:
+        """Merge this worker's outbox into the file, off the event loop"""
+        async with self._save_lock:
+            # Snapshot on the loop: the list and its items keep changing while the thread writes
+            snapshot = [dict(m) for m in self.outbox]
+            removed, self._removed = self._removed, set()
+            try:
+                await run_io('email_outbox', self._merge_outbox, snapshot, removed)
+            except BaseException:
+                self._removed |= removed
+                raise
+        OUTBOX_DEPTH.set(len(self.outbox))
+
+    async def enqueue(self, to: str, subject: str, body: str) -> str:
+        """Persist a message and wake the worker"""
+        message = {
+            'id': str(uuid.uuid4()),
+            'to': to,
+            'subject': subject,
+            'body': body,
+            'attempts': 0,
+            'next_attempt_at': time.time(),
+            'last_error': None,
+        }
+        self.outbox.append(message)
+        await self._save_outbox()
+        EMAILS.inc('queued')
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return message['id']
+
+    def _limiter(self) -> RateLimiter:
+        provider = f"{self.config['smtp_host']}:{self.config['smtp_port']}"
+        if provider not in self._limiters:
+            self._limiters[provider] = RateLimiter(self.config['max_per_minute'])
+        return self._limiters[provider]
+
+    def _build_message(self, item: Dict) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = self.config['sender']
+        message['To'] = item['to']
+        message['Subject'] = item['subject']
+        message['Message-ID'] = f"<{item['id']}@simple-charity-mvp>"
+        message.set_content(item['body'])
+        return message
+
+    def _schedule_retry(self, item: Dict, error: Exception) -> None:
+        item['attempts'] += 1
+        item['last_error'] = str(error)
+        if item['attempts'] >= self.config['max_attempts']:
+            item['dead'] = True
+            item['dead_at'] = time.time()
+            EMAILS.inc('dead')
+            logger.error("Giving up on email %s to %s after %d attempts: %s",
+                         item['id'], item['to'], item['attempts'], error)
+            return
+        ceiling = min(self.config['backoff_max'], self.config['backoff_base'] * (2 ** item['attempts']))
+        item['next_attempt_at'] = time.time() + random.uniform(ceiling / 2, ceiling)
+        EMAILS.inc('retry')
+
+    def _prune_dead(self) -> int:
+        """Drop dead messages older than the retention; returns how many"""
+        cutoff = time.time() - self.config['dead_retention_seconds']
+        expired = {m['id'] for m in self.outbox if m.get('dead') and m.get('dead_at', 0) <= cutoff}
+        if expired:
+            self.outbox = [m for m in self.outbox if m['id'] not in expired]
+            self._removed |= expired
+        return len(expired)
+
+    def due_messages(self) -> List[Dict]:
+        now = time.time()
+        due = [m for m in self.outbox if not m.get('dead') and m['next_attempt_at'] <= now]
+        return due[:self.config['batch_size']]
+
+    async def send_batch(self) -> int:
+        """Send up to batch_size due messages over a single SMTP connection"""
+        batch = self.due_messages()
+        if not batch:
+            if self._prune_dead():
+                await self._save_outbox()
+            return 0
+        if aiosmtplib is None:
+            logger.warning("aiosmtplib is not installed; %d emails stay queued", len(batch))
+            return 0
+
+        sent_ids = set()
+        rejected_ids = set()
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config['smtp_host'],
+            port=self.config['smtp_port'],
+            start_tls=self.config['smtp_starttls'],
+            timeout=30,
+        )
+        try:
+            await smtp.connect()
+            if self.config['smtp_username']:
+                await smtp.login(self.config['smtp_username'], self.config['smtp_password'])
+            for item in batch:
+                await self._limiter().acquire()
+                try:
+                    await smtp.send_message(self._build_message(item))
+                    sent_ids.add(item['id'])
+                    EMAILS.inc('sent')
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError):
+                    # Connection lost: handled below for the rest of the batch
+                    raise
+                except aiosmtplib.SMTPException as e:
+                    # Refused sender, recipients or data; the connection is still usable
+                    logger.warning("Email %s to %s refused: %s", item['id'], item['to'], e)
+                    self._schedule_retry(item, e)
+                    rejected_ids.add(item['id'])
+        except (aiosmtplib.SMTPException, OSError) as e:
+            logger.warning(f"SMTP connection to {self.config['smtp_host']} failed: {e}")
+            for item in batch:
+                if item['id'] not in sent_ids and item['id'] not in rejected_ids:
+                    self._schedule_retry(item, e)
+        finally:
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+        self.outbox = [m for m in self.outbox if m['id'] not in sent_ids]
+        self._removed |= sent_ids
+        self._prune_dead()
+        await self._save_outbox()
+        return len(sent_ids)
+
+    async def run_forever(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                while await self.send_batch():
+                    pass
+            except Exception as e:
+                logger.error(f"Email dispatcher error: {e}", exc_info=True)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config['poll_seconds'])
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def confirmation_email(order_id: str, amount, donor_name: Optional[str] = None) -> Dict[str, str]:
+    """Subject and body of the donation confirmation email"""
+    greeting = f"Szanowny/a {donor_name}," if donor_name and donor_name != 'Anonimowy' else "Szanowni Państwo,"
+    return {
+        'subject': f"Potwierdzenie darowizny {order_id}",
+        'body': (
+            f"{greeting}\n\n"
+            f"dziękujemy za przekazanie darowizny w kwocie {float(amount):.2f} PLN.\n"
+            f"Numer zamówienia: {order_id}\n\n"
+            "Z wyrazami wdzięczności,\n"
+            "Misjonarze Parafia Świętej Rodziny w Tarnowie\n"
+        ),
+    }
+
+
+# Create singleton instance
+email_dispatcher = EmailDispatcher()
+
+
+async def queue_confirmation(payment: Dict) -> Optional[str]:
+    """Queue the confirmation email for an approved payment, if email is enabled"""
+    if not email_dispatcher.config['enabled'] or not payment.get('donor_email'):
+        return None
+    content = confirmation_email(
+        payment.get('order_id'),
+        payment.get('amount', 0),
+        None if payment.get('is_anonymous') else payment.get('donor_name'),
+    )
+    return await email_dispatcher.enqueue(payment['donor_email'], content['subject'], content['body'])
@@ -1,9 +1,10 @@
-import requests
 import hmac
 import hashlib
 import base64
 import logging
 
+from .fiserv_gateway import fiserv_gateway
+
 logger = logging.getLogger(__name__)
 
 def generate_hash(params, secret_key):
@@ -13,12 +14,13 @@ def generate_hash(params, secret_key):
     hash_value = hmac.new(secret_key.encode(), param_string.encode(), hashlib.sha256).digest()
     return base64.b64encode(hash_value).decode()
 
-def create_payment(params, endpoint, secret_key):
+async def create_payment(params, endpoint, secret_key):
+    """Post payment params using the shared pooled client (non-blocking)"""
     params['hash'] = generate_hash(params, secret_key)
-    logger.debug(f"Sending request to {endpoint} with params: {params}")
-    response = requests.post(endpoint, data=params)
-    logger.debug(f"Response status code: {response.status_code}, Response body: {response.text}")
+    logger.debug("Sending request to %s with params: %s", endpoint, params)
+    response = await fiserv_gateway.client.post(endpoint, data=params)
+    logger.debug("Response status code: %s, Response body: %s", response.status_code, response.text)
     return response
 
 # Example usage
-# response = create_payment(payment_params, 'https://test.fiserv.com', 'your_secret_key')
+# response = await create_payment(payment_params, 'https://test.fiserv.com', 'your_secret_key')
@@ -0,0 +1,229 @@
+"""
+Async outbound client for Fiserv server-to-server REST calls
+(order status inquiry, refunds). One pooled httpx.AsyncClient is shared per
+process so calls reuse keep-alive connections instead of paying a TCP/TLS
+handshake each time. Retries use exponential backoff with full jitter and a
+circuit breaker stops hammering the gateway while it is down.
+"""
+
+import os
+import json
+import time
+import uuid
+import hmac
+import random
+import base64
+import hashlib
+import asyncio
+import logging
+from typing import Dict, Optional, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx when installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+GATEWAY_CONFIG = {
+    'api_key': os.getenv('FISERV_API_KEY', ''),
+    'api_secret': os.getenv('FISERV_API_SECRET', ''),
+    'base_url': os.getenv('FISERV_BASE_URL', 'https://prod.emea.api.fiservapps.com/sandbox/ipp/payments-gateway/v2'),
+    'connect_timeout': float(os.getenv('FISERV_CONNECT_TIMEOUT', '3.0')),
+    'read_timeout': float(os.getenv('FISERV_READ_TIMEOUT', '10.0')),
+    'max_connections': int(os.getenv('FISERV_MAX_CONNECTIONS', '20')),
+    'max_retries': int(os.getenv('FISERV_MAX_RETRIES', '3')),
+    'backoff_base': float(os.getenv('FISERV_BACKOFF_BASE', '0.2')),
+    'backoff_max': float(os.getenv('FISERV_BACKOFF_MAX', '5.0')),
+    'breaker_threshold': int(os.getenv('FISERV_BREAKER_THRESHOLD', '5')),
+    'breaker_reset_seconds': float(os.getenv('FISERV_BREAKER_RESET_SECONDS', '30')),
+}
+
+# Responses worth retrying; anything else is returned to the caller
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    """Raised when the gateway cannot be reached or keeps failing"""
+
+
+class CircuitOpenError(GatewayError):
+    """Raised without a network call while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker: closed -> open after `threshold` consecutive
+    failures; after `reset_seconds` one trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError or admit the call; True when it is the half-open trial"""
+        state = self.state
+        if state == 'open':
+            raise CircuitOpenError("Fiserv gateway circuit is open")
+        if state == 'half_open':
+            if self._trial_in_flight:
+                raise CircuitOpenError("Fiserv gateway circuit is half-open, trial call in progress")
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def end_trial(self) -> None:
+        """Trial finished without an outcome (cancelled, unexpected error): let the next call try"""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class FiservGatewayClient:
+    """Pooled, signed client for the Fiserv IPG REST API"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 api_secret: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.config = {**GATEWAY_CONFIG, **(config or {})}
+        self.base_url = (base_url or self.config['base_url']).rstrip('/')
+        self.api_key = api_key if api_key is not None else self.config['api_key']
+        self.api_secret = api_secret if api_secret is not None else self.config['api_secret']
+        self.breaker = CircuitBreaker(self.config['breaker_threshold'], self.config['breaker_reset_seconds'])
+        # Injected transport lets tests run against httpx.MockTransport or a local stub
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared AsyncClient, created lazily inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE and self._transport is None,
+                timeout=httpx.Timeout(self.config['read_timeout'], connect=self.config['connect_timeout']),
+                limits=httpx.Limits(
+                    max_connections=self.config['max_connections'],
+                    max_keepalive_connections=self.config['max_connections'],
+                    keepalive_expiry=60,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _signed_headers(self, body: str) -> Dict[str, str]:
+        """Api-Key / Client-Request-Id / Timestamp / Message-Signature headers"""
+        client_request_id = str(uuid.uuid4())
+        timestamp = str(int(time.time() * 1000))
+        message = f"{self.api_key}{client_request_id}{timestamp}{body}"
+        signature = hmac.new(
+            self.api_secret.encode('utf-8'),
+            message.encode('utf-8'),
+            hashlib.sha256
+        ).digest()
+        return {
+            'Content-Type': 'application/json',
+            'Api-Key': self.api_key,
+            'Client-Request-Id': client_request_id,
+            'Timestamp': timestamp,
+            'Message-Signature': base64.b64encode(signature).decode('utf-8'),
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        ceiling = min(self.config['backoff_max'], self.config['backoff_base'] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    async def request(self, method: str, path: str, payload: Optional[Dict] = None) -> httpx.Response:
+        """
+        Send a signed request, retrying transport errors and 429/5xx.
+        Non-idempotent calls (POST) are only retried when the request never
+        reached the server (connect errors) or the server asked us to (429/503).
+        """
+        body = json.dumps(payload, separators=(',', ':')) if payload is not None else ''
+        idempotent = method.upper() in ('GET', 'HEAD', 'DELETE')
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.config['max_retries'] + 1):
+            trial = self.breaker.before_call()
+            try:
+                response = await self.client.request(
+                    method, path, content=body or None, headers=self._signed_headers(body)
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                last_error = e
+                self.breaker.record_failure()
+            except httpx.TransportError as e:
+                last_error = e
+                self.breaker.record_failure()
+                if not idempotent:
+                    break
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                last_error = GatewayError(f"Fiserv gateway returned {response.status_code}")
+                if not idempotent and response.status_code not in (429, 503):
+                    return response
+            finally:
+                # Cancellation or an unexpected error must not leave the trial slot taken
+                if trial:
+                    self.breaker.end_trial()
+
+            if attempt < self.config['max_retries']:
+                delay = self._backoff(attempt)
+                logger.warning("Fiserv %s %s failed (%s), retry %d in %.2fs",
+                               method, path, last_error, attempt + 1, delay)
+                await asyncio.sleep(delay)
+
+        raise GatewayError(f"Fiserv {method} {path} failed after retries: {last_error}")
+
+    async def get_order_status(self, order_id: str) -> Dict[str, Any]:
+        """Inquiry for an order created through the Connect (hosted page) flow"""
+        response = await self.request('GET', f"/orders/{order_id}")
+        response.raise_for_status()
+        return response.json()
+
+    async def refund(self, order_id: str, amount: float, currency: str = 'PLN') -> Dict[str, Any]:
+        """Return (refund) part or all of an order's settled amount"""
+        response = await self.request('POST', f"/orders/{order_id}", {
+            'requestType': 'ReturnTransaction',
+            'transactionAmount': {'total': f"{amount:.2f}", 'currency': currency},
+        })
+        response.raise_for_status()
+        return response.json()
+
+
+# Create singleton instance
+fiserv_gateway = FiservGatewayClient()
@@ -0,0 +1,157 @@
+"""
+Idempotent request handling
+A double-tapped donate button sends the same /initiate request twice; each
+would create its own order, sign its own form and rewrite the store. The
+first response is therefore kept for IDEMPOTENCY_TTL_SECONDS under the
+request's key and replayed to repeats, and a repeat that arrives while the
+first is still being computed waits for it instead of racing it.
+
+The key is the client's Idempotency-Key header (scoped to the client, so
+two clients picking the same key don't share responses), or - for clients
+that do not send one - a hash of the donor, goal and amount within a short
+time window (derive_keys). Anonymous donations are never derived: two
+anonymous donors may well give the same amount to the same goal. A header
+key reused with a different request body is rejected rather than replayed.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .metrics import registry
+
+IDEMPOTENCY_CONFIG = {
+    'ttl_seconds': float(os.getenv('IDEMPOTENCY_TTL_SECONDS', '600')),
+    # Derived keys: repeats within this window count as the same request
+    'window_seconds': float(os.getenv('IDEMPOTENCY_WINDOW_SECONDS', '10')),
+    'max_entries': int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000')),
+}
+
+IDEMPOTENT_REQUESTS = registry.counter(
+    "idempotent_requests_total",
+    "Requests carrying an idempotency key, by result (miss, replayed, coalesced, conflict)",
+    ("route", "result"),
+)
+
+MAX_KEY_LENGTH = 200
+
+# Default donor_name of the payment forms; not an identity
+ANONYMOUS_NAMES = {'', 'anonimowy'}
+
+
+def fingerprint(*parts: Any) -> str:
+    return hashlib.sha256('\x1f'.join('' if p is None else str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def derive_keys(*parts: Any, now: Optional[float] = None) -> Tuple[str, str]:
+    """
+    Keys for a request without Idempotency-Key: (current window, previous
+    window). Looking both up catches repeats straddling a window boundary.
+    """
+    window = IDEMPOTENCY_CONFIG['window_seconds']
+    bucket = int((now or time.time()) // window)
+    return (f"derived:{fingerprint(bucket, *parts)}", f"derived:{fingerprint(bucket - 1, *parts)}")
+
+
+def donor_identity(donor_email: Optional[str], donor_name: Optional[str], is_anonymous: bool) -> Tuple:
+    """Parts identifying the donor for derive_keys; () when the donation is anonymous"""
+    if is_anonymous:
+        return ()
+    name = (donor_name or '').strip()
+    if name.lower() in ANONYMOUS_NAMES:
+        name = ''
+    if not donor_email and not name:
+        return ()
+    return (donor_email or '', name)
+
+
+def request_keys(header_key: Optional[str], client: str, request_parts: Tuple,
+                 identity_parts: Tuple) -> Optional[Tuple[str, Tuple[str, ...], Optional[str]]]:
+    """
+    (key, aliases, request fingerprint) for IdempotencyCache.run, or None
+    when the request can't be keyed: no header and no donor identity to
+    derive one from (see donor_identity).
+    """
+    if header_key:
+        if len(header_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        return f"key:{fingerprint(client, header_key)}", (), fingerprint(*request_parts)
+    if not identity_parts:
+        return None
+    key, previous = derive_keys(*identity_parts, *request_parts)
+    return key, (previous,), None
+
+
+class IdempotencyCache:
+
+    def __init__(self, route: str, config: Dict = IDEMPOTENCY_CONFIG):
+        self.route = route
+        self.config = config
+        # key -> (expires_at, request fingerprint, response)
+        self._responses: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    def _lookup(self, key: str) -> Optional[Tuple[float, str, Any]]:
+        entry = self._responses.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._responses[key]
+            return None
+        return entry
+
+    def _check(self, key: str, request_fingerprint: Optional[str], stored: str) -> None:
+        if request_fingerprint is not None and stored != request_fingerprint:
+            IDEMPOTENT_REQUESTS.inc(self.route, 'conflict')
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+    def forget(self, key: str) -> None:
+        self._responses.pop(key, None)
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]],
+                  request_fingerprint: Optional[str] = None, aliases: Tuple[str, ...] = (),
+                  still_valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the stored response for `key` (or any of `aliases`), join the
+        in-flight computation for it, or compute, store and return a new one.
+        Failed computations are not stored. `still_valid(response)` can veto
+        replaying a stored response (e.g. its payment was already declined).
+        """
+        for candidate in (key, *aliases):
+            entry = self._lookup(candidate)
+            if entry is not None:
+                self._check(candidate, request_fingerprint, entry[1])
+                if still_valid is None or still_valid(entry[2]):
+                    IDEMPOTENT_REQUESTS.inc(self.route, 'replayed')
+                    return entry[2]
+                self.forget(candidate)
+            in_flight = self._in_flight.get(candidate)
+            if in_flight is not None:
+                self._check(candidate, request_fingerprint, in_flight[0])
+                IDEMPOTENT_REQUESTS.inc(self.route, 'coalesced')
+                # shield: a waiter giving up must not cancel the shared computation
+                return await asyncio.shield(in_flight[1])
+
+        IDEMPOTENT_REQUESTS.inc(self.route, 'miss')
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_fingerprint or '', future)
+        try:
+            response = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting; don't log "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(response)
+        self._responses[key] = (time.monotonic() + self.config['ttl_seconds'], request_fingerprint or '', response)
+        while len(self._responses) > self.config['max_entries']:
+            self._responses.popitem(last=False)
+        return response
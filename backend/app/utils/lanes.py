@@ -0,0 +1,177 @@
+"""
+Request priority lanes
+Every route runs on the same event loop, so a burst of QR renders or stats
+scans used to delay Fiserv's S2S notifications and donors' initiate calls.
+Routes now declare a lane:
+
+    @router.get("/organization/qr/{goal_id}")
+    @lanes.background
+    async def generate_qr_code(goal_id: str): ...
+
+    critical    webhooks, initiate, status polls
+    normal      organization and goal pages
+    background  stats, QR codes, debug and admin endpoints
+
+Each lane has a concurrency budget (LANE_<NAME>_CONCURRENCY) and its own
+thread pool: run_io() called from a request of a lane runs on that lane's
+executor, so blocking work of background routes never occupies the storage
+I/O threads the critical lane uses. When slots free up, waiting requests
+are woken strictly by lane priority, and a lower lane doesn't start new
+work while a higher lane has requests queued. Routes without a lane are
+not budgeted.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional
+
+from .metrics import registry
+
+
+def _lane_config(name: str, concurrency: int, workers: int) -> Dict:
+    prefix = f"LANE_{name.upper()}"
+    return {
+        'concurrency': int(os.getenv(f'{prefix}_CONCURRENCY', str(concurrency))),
+        # 0: use the storage I/O pool
+        'workers': int(os.getenv(f'{prefix}_WORKERS', str(workers))),
+    }
+
+
+# Highest priority first
+LANE_CONFIG = {
+    'critical': _lane_config('critical', 256, 0),
+    'normal': _lane_config('normal', 32, 2),
+    'background': _lane_config('background', 4, 1),
+}
+
+LANE_IN_FLIGHT = registry.gauge(
+    "lane_in_flight",
+    "Requests running, by priority lane",
+    ("lane",),
+)
+LANE_QUEUE_DEPTH = registry.gauge(
+    "lane_queue_depth",
+    "Requests waiting for a lane slot, by priority lane",
+    ("lane",),
+)
+LANE_WAIT = registry.histogram(
+    "lane_queue_wait_seconds",
+    "Time requests waited for a lane slot, by priority lane",
+    ("lane",),
+)
+LANE_LATENCY = registry.histogram(
+    "lane_request_duration_seconds",
+    "Handler time of requests once admitted to their lane, by priority lane",
+    ("lane",),
+)
+
+# Lane of the request being handled (inherited by tasks and run_io calls)
+current_lane: contextvars.ContextVar[Optional["Lane"]] = contextvars.ContextVar('current_lane', default=None)
+
+
+class Lane:
+
+    def __init__(self, scheduler: "LaneScheduler", name: str, priority: int, config: Dict):
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.concurrency = config['concurrency']
+        self.executor: Optional[Executor] = (
+            ThreadPoolExecutor(max_workers=config['workers'], thread_name_prefix=f'lane-{name}')
+            if config['workers'] > 0 else None
+        )
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    def can_start(self) -> bool:
+        return self.in_flight < self.concurrency and not self.scheduler.higher_waiting(self)
+
+    async def acquire(self) -> None:
+        if not self.waiters and self.can_start():
+            self.in_flight += 1
+            LANE_WAIT.observe(0.0, self.name)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            LANE_QUEUE_DEPTH.set(len(self.waiters), self.name)
+            start = time.perf_counter()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted a slot just as we were cancelled: pass it on
+                    self.release()
+                else:
+                    self.waiters.remove(waiter)
+                    LANE_QUEUE_DEPTH.set(len(self.waiters), self.name)
+                raise
+            LANE_WAIT.observe(time.perf_counter() - start, self.name)
+        LANE_IN_FLIGHT.set(self.in_flight, self.name)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        LANE_IN_FLIGHT.set(self.in_flight, self.name)
+        self.scheduler.wake()
+
+    def __call__(self, endpoint: Callable) -> Callable:
+        """Decorator declaring the lane of an async route handler"""
+        @functools.wraps(endpoint)
+        async def run_in_lane(*args, **kwargs):
+            await self.acquire()
+            token = current_lane.set(self)
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                LANE_LATENCY.observe(time.perf_counter() - start, self.name)
+                current_lane.reset(token)
+                self.release()
+        return run_in_lane
+
+
+class LaneScheduler:
+
+    def __init__(self, config: Dict = LANE_CONFIG):
+        self.lanes = [Lane(self, name, priority, lane_config)
+                      for priority, (name, lane_config) in enumerate(config.items())]
+
+    def higher_waiting(self, lane: Lane) -> bool:
+        return any(other.waiters for other in self.lanes[:lane.priority])
+
+    def wake(self) -> None:
+        """Hand free slots to waiting requests, highest priority lane first"""
+        for lane in self.lanes:
+            while lane.waiters and lane.in_flight < lane.concurrency:
+                waiter = lane.waiters.popleft()
+                if waiter.done():
+                    continue
+                lane.in_flight += 1
+                waiter.set_result(None)
+            LANE_QUEUE_DEPTH.set(len(lane.waiters), lane.name)
+            if lane.waiters:
+                # Saturated lane with a queue: lower lanes keep waiting
+                return
+
+    def shutdown(self) -> None:
+        for lane in self.lanes:
+            if lane.executor is not None:
+                lane.executor.shutdown(wait=True)
+
+
+def lane_executor() -> Optional[Executor]:
+    """Executor of the current request's lane; None outside lanes or for the critical lane"""
+    lane = current_lane.get()
+    return lane.executor if lane is not None else None
+
+
+scheduler = LaneScheduler()
+critical, normal, background = scheduler.lanes
+
+
+def shutdown() -> None:
+    scheduler.shutdown()
@@ -0,0 +1,152 @@
+"""
+Non-blocking structured logging
+Handlers on the event loop only merge the message with its args and enqueue
+the LogRecord; line formatting, JSON rendering and the stderr write happen on
+a QueueListener thread.
+Hot-path DEBUG records can be sampled per module before they are enqueued.
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json | text
+# e.g. "app.routes.payments_production_hardened=0.1,app.utils=0.5"
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed via `extra=`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records for configured logger prefixes.
+    INFO and above always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix wins
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                return random.random() < rate
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only merges msg and args on the calling thread. The
+    stock prepare() also renders the whole formatted line (and traceback)
+    there; that part is left to the listener. Merging first keeps mutable
+    args from changing before the listener gets to them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the event loop on logging; drop instead
+            pass
+
+
+class lazy_json:
+    """Defer json.dumps of a payload until a handler actually renders it"""
+
+    __slots__ = ('obj', 'indent')
+
+    def __init__(self, obj, indent: Optional[int] = None):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self) -> str:
+        return json.dumps(self.obj, indent=self.indent, default=str)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, rate = item.split('=', 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rates: str = LOG_SAMPLE_RATES) -> None:
+    """
+    Route the root logger through a bounded queue to a background listener.
+    Replaces handlers installed earlier by logging.basicConfig().
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if fmt == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(sample_rates)))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
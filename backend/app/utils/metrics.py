@@ -0,0 +1,206 @@
+"""
+In-process metrics registry with Prometheus text exposition
+Counters and histograms are plain Python dicts and lists; an observation is
+a bisect plus two additions, no I/O. Each metric has its own lock: the
+storage I/O pool and the lane executors update metrics from worker threads,
+and an unguarded read-modify-write there loses updates.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple, Optional, Iterable
+
+# Default latency buckets in seconds (0.5ms .. 10s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a Prometheus label set, e.g. {route="/x",method="GET"}"""
+    pairs = [(n, v) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        """Snapshot of every label set's value"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in sorted(self.samples().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down (in-flight requests, queue depth)"""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Bucket counts are stored non-cumulatively and
+    summed only when rendered, keeping observe() to a single bisect.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[bucket] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Context manager observing the elapsed wall time of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[:-1]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += bucket_count
+                label_str = _format_labels(self.labelnames, labels, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{label_str} {cumulative}"
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {_format_value(series[-1])}"
+            yield f"{self.name}_count{label_str} {cumulative}"
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders the /metrics payload"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+# Shared payment metrics
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+PAYMENT_STAGE_LATENCY = registry.histogram(
+    "payment_stage_duration_seconds",
+    "Latency of internal stages of payment handlers",
+    ("handler", "stage"),
+)
+RATE_LIMIT_REJECTIONS = registry.counter(
+    "payment_rate_limit_rejections_total",
+    "Payment initiations rejected by the rate limiter",
+)
+WEBHOOK_OUTCOMES = registry.counter(
+    "payment_webhook_outcomes_total",
+    "S2S webhooks processed, by reported transaction status",
+    ("status",),
+)
+WEBHOOK_DUPLICATES = registry.counter(
+    "payment_webhook_duplicates_total",
+    "S2S webhooks skipped because they were already processed",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def stage_timer(handler: str, stage: str):
+    """Shortcut: `with stage_timer('initiate', 'hash_generation'): ...`"""
+    return PAYMENT_STAGE_LATENCY.time(handler, stage)
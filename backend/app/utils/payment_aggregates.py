@@ -0,0 +1,245 @@
+"""
+Vectorized aggregates over live payments
+PaymentColumns keeps the fields the stats endpoints need (amount, created,
+goal, status) in preallocated NumPy columns, one row per payment, appended
+or updated in place as payments arrive. Counts, sums, success rates and
+percentiles are bincount / percentile calls over those arrays rather than
+generator sums over lists of dicts.
+
+It is owned and maintained by payment_index (rebuilt with it, updated on
+record_write).
+
+Benchmark:
+    python -m app.utils.payment_aggregates --payments 1000000
+"""
+
+import time
+import random
+import argparse
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .payment_snapshot import SUCCESS_STATUSES, epoch_seconds
+
+INITIAL_CAPACITY = 1024
+PERCENTILES = (50, 90, 99)
+
+
+def _parse_timestamps(values: List[str]) -> np.ndarray:
+    """ISO timestamps -> wall-clock epoch seconds, parsed by NumPy in C"""
+    try:
+        # Seconds precision; naive timestamps as stored by the routers
+        parsed = np.array([v[:19] or 'NaT' for v in values], dtype='datetime64[s]').astype(np.int64)
+        parsed[parsed == np.iinfo(np.int64).min] = 0
+        return parsed
+    except ValueError:
+        # Something NumPy can't read (e.g. a UTC offset); parse row by row
+        return np.array([epoch_seconds(v) for v in values], dtype=np.int64)
+
+
+class PaymentColumns:
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._size = 0
+        self._amount = np.zeros(capacity, dtype=np.int64)  # grosze
+        self._created = np.zeros(capacity, dtype=np.int64)
+        self._goal = np.zeros(capacity, dtype=np.int32)
+        self._status = np.zeros(capacity, dtype=np.int8)
+        self._rows: Dict[str, int] = {}
+        self.goal_codes: Dict[str, int] = {}
+        self.goal_values: List[str] = []
+        self.status_codes: Dict[str, int] = {}
+        self.status_values: List[str] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _encode(codes: Dict[str, int], values: List[str], value: str) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _grow(self) -> None:
+        capacity = max(INITIAL_CAPACITY, len(self._amount) * 2)
+        for name in ('_amount', '_created', '_goal', '_status'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def _values(self, payment: Dict, parse_created: bool = True):
+        return (
+            round(float(payment.get('amount') or 0) * 100),
+            epoch_seconds(payment.get('created_at')) if parse_created else 0,
+            self._encode(self.goal_codes, self.goal_values, payment.get('goal_id') or ''),
+            self._encode(self.status_codes, self.status_values, payment.get('status') or 'unknown'),
+        )
+
+    def upsert(self, payment: Dict) -> None:
+        """Append a new payment or update its row (status changes, mostly)"""
+        payment_id = payment.get('payment_id')
+        if not payment_id:
+            return
+        row = self._rows.get(payment_id)
+        if row is None:
+            if self._size == len(self._amount):
+                self._grow()
+            row = self._rows[payment_id] = self._size
+            self._size += 1
+        (self._amount[row], self._created[row],
+         self._goal[row], self._status[row]) = self._values(payment)
+
+    def extend(self, payments: Iterable[Dict]) -> None:
+        """Bulk load: collect into compact arrays, then copy into the columns once"""
+        amounts, goals, statuses = array('q'), array('i'), array('b')
+        # Timestamps are parsed in one vectorized call at the end
+        created: List[str] = []
+        for payment in payments:
+            payment_id = payment.get('payment_id')
+            if not payment_id:
+                continue
+            row = self._rows.get(payment_id)
+            if row is not None and row < self._size:
+                self.upsert(payment)
+                continue
+            amount, _, goal, status = self._values(payment, parse_created=False)
+            if row is None:
+                self._rows[payment_id] = self._size + len(amounts)
+                amounts.append(amount)
+                goals.append(goal)
+                statuses.append(status)
+                created.append(payment.get('created_at') or '')
+            else:
+                i = row - self._size
+                amounts[i], goals[i], statuses[i] = amount, goal, status
+                created[i] = payment.get('created_at') or ''
+
+        end = self._size + len(amounts)
+        while end > len(self._amount):
+            self._grow()
+        self._amount[self._size:end] = np.frombuffer(amounts, dtype=np.int64)
+        self._created[self._size:end] = _parse_timestamps(created)
+        self._goal[self._size:end] = np.frombuffer(goals, dtype=np.int32)
+        self._status[self._size:end] = np.frombuffer(statuses, dtype=np.int8)
+        self._size = end
+
+    # --- aggregates --------------------------------------------------------
+
+    def _mask(self, statuses: Iterable[str]) -> np.ndarray:
+        # Lookup table indexed by status code: one gather instead of np.isin
+        table = np.zeros(max(1, len(self.status_values)), dtype=bool)
+        table[[self.status_codes[s] for s in statuses if s in self.status_codes]] = True
+        return table[self._status[:self._size]]
+
+    def status_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self._status[:self._size], minlength=len(self.status_values))
+        return {self.status_values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def by_goal(self, statuses: Iterable[str] = SUCCESS_STATUSES,
+                selected: Optional[np.ndarray] = None) -> Dict[str, Dict[str, float]]:
+        """Donation count and total (PLN) per goal, for payments in `statuses`"""
+        if selected is None:
+            selected = self._mask(statuses)
+        goal = self._goal[:self._size][selected]
+        size = len(self.goal_values)
+        counts = np.bincount(goal, minlength=size)
+        totals = np.bincount(goal, weights=self._amount[:self._size][selected], minlength=size)
+        return {
+            self.goal_values[code]: {'count': int(counts[code]), 'total': round(float(totals[code]) / 100, 2)}
+            for code in np.flatnonzero(counts)
+        }
+
+    def percentiles(self, statuses: Iterable[str] = SUCCESS_STATUSES, points=PERCENTILES,
+                    selected: Optional[np.ndarray] = None) -> Optional[Dict[str, float]]:
+        if selected is None:
+            selected = self._mask(statuses)
+        amounts = self._amount[:self._size][selected]
+        if not len(amounts):
+            return None
+        values = np.percentile(amounts, points)
+        return {f"p{point}": round(float(value) / 100, 2) for point, value in zip(points, values)}
+
+    def summary(self) -> Dict:
+        """Totals used by /api/payments/stats"""
+        counts = self.status_counts()
+        total = self._size
+        successful = sum(counts.get(s, 0) for s in SUCCESS_STATUSES)
+        selected = self._mask(SUCCESS_STATUSES)
+        revenue = int(self._amount[:self._size][selected].sum())
+        return {
+            'total_payments': total,
+            'approved': successful,
+            'declined': counts.get('declined', 0),
+            'pending': counts.get('pending', 0),
+            'by_status': counts,
+            'total_revenue': round(revenue / 100, 2),
+            'success_rate': round(successful / total * 100, 2) if total > 0 else 0,
+            'amount_percentiles': self.percentiles(selected=selected),
+            'by_goal': self.by_goal(selected=selected),
+        }
+
+
+def _python_summary(payments: List[Dict]) -> Dict:
+    """The dict-based computation the endpoints used before, for the benchmark"""
+    total = len(payments)
+    approved = sum(1 for p in payments if p.get('status') == 'approved')
+    declined = sum(1 for p in payments if p.get('status') == 'declined')
+    pending = sum(1 for p in payments if p.get('status') == 'pending')
+    revenue = sum(p.get('amount', 0) for p in payments if p.get('status') == 'approved')
+    by_goal: Dict[str, float] = {}
+    for p in payments:
+        if p.get('status') == 'approved':
+            by_goal[p.get('goal_id')] = by_goal.get(p.get('goal_id'), 0) + p.get('amount', 0)
+    amounts = sorted(p.get('amount', 0) for p in payments if p.get('status') == 'approved')
+    percentiles = [amounts[int(len(amounts) * point / 100)] for point in PERCENTILES] if amounts else None
+    return {'total': total, 'approved': approved, 'declined': declined, 'pending': pending,
+            'revenue': revenue, 'by_goal': by_goal, 'percentiles': percentiles}
+
+
+def benchmark(count: int, repeat: int = 5) -> Dict[str, float]:
+    rng = random.Random(0)
+    goals = ['church', 'poor', 'candles']
+    statuses = ['approved'] * 6 + ['declined', 'failed', 'pending', 'expired']
+    payments = [{
+        'payment_id': f"p{i}",
+        'goal_id': rng.choice(goals),
+        'amount': rng.choice([10, 20, 50, 100, 250]) + rng.randint(0, 99) / 100,
+        'status': rng.choice(statuses),
+        'created_at': f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T12:00:00",
+    } for i in range(count)]
+
+    start = time.perf_counter()
+    columns = PaymentColumns()
+    columns.extend(payments)
+    build = time.perf_counter() - start
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    python_seconds = best(lambda: _python_summary(payments))
+    vectorized_seconds = best(columns.summary)
+    return {
+        'payments': count,
+        'build_seconds': round(build, 3),
+        'python_seconds': round(python_seconds, 4),
+        'vectorized_seconds': round(vectorized_seconds, 4),
+        'speedup': round(python_seconds / vectorized_seconds, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark payment stats: dict scans vs. columns")
+    parser.add_argument('--payments', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(benchmark(args.payments, args.repeat))
@@ -0,0 +1,328 @@
+"""
+Archive tiering for settled payments
+Payments in a terminal state older than ARCHIVE_AFTER_DAYS are moved out of
+the hot store (data/payments.json) into immutable monthly segments, so the
+hot store only holds recent and pending records.
+
+A segment is JSONL compressed in independent blocks (gzip members or zstd
+frames concatenated into one file), written once and never modified; each
+run adds new segments (payments-2025-08-0001.jsonl.gz, -0002, ...). Next to
+it a small index records block offsets and which block holds each order and
+payment ID, so a lookup decompresses one block instead of the segment.
+
+Segments are named and written under payments_lock and never replace an
+existing file, so workers archiving at the same time can't overwrite each
+other's segments; readers reload the segment list when the directory changes.
+"""
+
+import os
+import re
+import gzip
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import registry
+from .storage_io import run_io, payments_lock
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, only needed for ARCHIVE_COMPRESSION=zstd
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CONFIG = {
+    'enabled': os.getenv('ARCHIVE_ENABLED', 'false').lower() == 'true',
+    'directory': os.getenv('ARCHIVE_DIR', 'data/archive'),
+    'after_days': float(os.getenv('ARCHIVE_AFTER_DAYS', '90')),
+    'compression': os.getenv('ARCHIVE_COMPRESSION', 'gzip'),  # gzip | zstd
+    'block_records': int(os.getenv('ARCHIVE_BLOCK_RECORDS', '256')),
+    'interval_seconds': float(os.getenv('ARCHIVE_INTERVAL_SECONDS', '86400')),
+}
+
+# 'completed' is written by the older payment routers
+ARCHIVABLE_STATUSES = {'approved', 'declined', 'failed', 'expired', 'completed'}
+
+SEGMENT_PATTERN = re.compile(r'^payments-(\d{4}-\d{2})-(\d{4})\.jsonl\.(gz|zst)$')
+INDEX_SUFFIX = '.idx.json'
+
+ARCHIVED = registry.counter(
+    "payments_archived_total",
+    "Payments moved from the hot store into archive segments",
+)
+ARCHIVE_SEGMENTS = registry.gauge(
+    "payment_archive_segments",
+    "Archive segments on disk",
+)
+ARCHIVE_LOOKUPS = registry.counter(
+    "payment_archive_lookups_total",
+    "Lookups that fell back to the archive, by outcome",
+    ("outcome",),
+)
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst archive segments")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PaymentArchive:
+    """Reads and writes archive segments; keeps an in-memory map of archived IDs"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = {**ARCHIVE_CONFIG, **(config or {})}
+        self.directory = self.config['directory']
+        self.loaded = False
+        # order_id / payment_id -> (segment file name, block number)
+        self._orders: Dict[str, Tuple[str, int]] = {}
+        self._payments: Dict[str, Tuple[str, int]] = {}
+        self._segments: Dict[str, Dict] = {}
+        self._directory_mtime: Optional[int] = None
+
+    @property
+    def codec(self) -> str:
+        if self.config['compression'] == 'zstd':
+            if zstandard is not None:
+                return 'zst'
+            logger.warning("ARCHIVE_COMPRESSION=zstd but zstandard is not installed; using gzip")
+        return 'gz'
+
+    # --- index -------------------------------------------------------------
+
+    def _register(self, name: str, index: Dict) -> None:
+        self._segments[name] = index
+        for order_id, block in index['orders'].items():
+            self._orders[order_id] = (name, block)
+        for payment_id, block in index['payments'].items():
+            self._payments[payment_id] = (name, block)
+
+    def _dir_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> None:
+        self._orders.clear()
+        self._payments.clear()
+        self._segments.clear()
+        self._directory_mtime = self._dir_mtime()
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not SEGMENT_PATTERN.match(name):
+                    continue
+                index_path = os.path.join(self.directory, name + INDEX_SUFFIX)
+                try:
+                    with open(index_path, 'r') as f:
+                        self._register(name, json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Archive segment {name} has no usable index: {e}")
+        self.loaded = True
+        ARCHIVE_SEGMENTS.set(len(self._segments))
+
+    def _ensure_loaded(self) -> None:
+        # Segments added by another worker change the directory's mtime
+        if not self.loaded or self._dir_mtime() != self._directory_mtime:
+            self.load()
+
+    def contains_order(self, order_id: str) -> bool:
+        self._ensure_loaded()
+        return order_id in self._orders
+
+    # --- reads -------------------------------------------------------------
+
+    def _read_block(self, name: str, block: int) -> List[Dict]:
+        offset, length = self._segments[name]['blocks'][block]
+        codec = SEGMENT_PATTERN.match(name).group(3)
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            f.seek(offset)
+            data = _decompress(f.read(length), codec)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def _find(self, location: Optional[Tuple[str, int]], field: str, value: str) -> Optional[Dict]:
+        if location is None:
+            ARCHIVE_LOOKUPS.inc('miss')
+            return None
+        for payment in self._read_block(*location):
+            if payment.get(field) == value:
+                ARCHIVE_LOOKUPS.inc('hit')
+                return payment
+        ARCHIVE_LOOKUPS.inc('miss')
+        return None
+
+    def find_by_order(self, order_id: str) -> Optional[Dict]:
+        self._ensure_loaded()
+        return self._find(self._orders.get(order_id), 'order_id', order_id)
+
+    def find_by_payment(self, payment_id: str) -> Optional[Dict]:
+        self._ensure_loaded()
+        return self._find(self._payments.get(payment_id), 'payment_id', payment_id)
+
+    def iter_payments(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[Dict]:
+        """Archived payments, oldest month first; segments outside the date range are skipped"""
+        self._ensure_loaded()
+        for name, index in sorted(self._segments.items()):
+            if date_from and index['max_created'][:10] < date_from:
+                continue
+            if date_to and index['min_created'][:10] > date_to:
+                continue
+            for block in range(len(index['blocks'])):
+                yield from self._read_block(name, block)
+
+    # --- writes ------------------------------------------------------------
+
+    def _next_segment_name(self, month: str, codec: str) -> str:
+        # Listed again rather than taken from the loaded index: another worker may have added segments
+        sequences = [int(m.group(2)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.directory))
+                     if m and m.group(1) == month]
+        return f"payments-{month}-{max(sequences, default=0) + 1:04d}.jsonl.{codec}"
+
+    def write_segment(self, month: str, payments: List[Dict]) -> str:
+        """Write one immutable segment plus its index; both land atomically, the segment never over an existing one"""
+        with payments_lock:
+            self._ensure_loaded()
+            os.makedirs(self.directory, exist_ok=True)
+            name = self._write_segment(month, payments)
+            self._directory_mtime = self._dir_mtime()
+        return name
+
+    def _write_segment(self, month: str, payments: List[Dict]) -> str:
+        codec = self.codec
+        name = self._next_segment_name(month, codec)
+        path = os.path.join(self.directory, name)
+        payments = sorted(payments, key=lambda p: p.get('created_at') or '')
+        block_records = max(1, self.config['block_records'])
+
+        index = {
+            'segment': name,
+            'count': len(payments),
+            'min_created': payments[0].get('created_at') or '',
+            'max_created': payments[-1].get('created_at') or '',
+            'blocks': [],
+            'orders': {},
+            'payments': {},
+        }
+        offset = 0
+        with open(path + '.tmp', 'wb') as f:
+            for start in range(0, len(payments), block_records):
+                block = payments[start:start + block_records]
+                block_no = len(index['blocks'])
+                lines = ''.join(json.dumps(p, ensure_ascii=False) + '\n' for p in block)
+                data = _compress(lines.encode('utf-8'), codec)
+                f.write(data)
+                index['blocks'].append([offset, len(data)])
+                offset += len(data)
+                for payment in block:
+                    if payment.get('order_id'):
+                        index['orders'][payment['order_id']] = block_no
+                    if payment.get('payment_id'):
+                        index['payments'][payment['payment_id']] = block_no
+            f.flush()
+            os.fsync(f.fileno())
+        # Segment first: a segment without an index is ignored on load.
+        # link() fails instead of replacing a segment that already exists.
+        try:
+            os.link(path + '.tmp', path)
+        finally:
+            os.remove(path + '.tmp')
+        with open(path + INDEX_SUFFIX + '.tmp', 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(path + INDEX_SUFFIX + '.tmp', path + INDEX_SUFFIX)
+
+        self._register(name, index)
+        ARCHIVE_SEGMENTS.set(len(self._segments))
+        return name
+
+    def is_archivable(self, payment: Dict, cutoff: str) -> bool:
+        return (payment.get('status') in ARCHIVABLE_STATUSES
+                and bool(payment.get('created_at'))
+                and payment['created_at'] < cutoff)
+
+    def archive_once(self, load_payments: Callable[[], List[Dict]],
+                     save_payments: Callable[[List[Dict]], None],
+                     now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Move settled payments older than after_days into new segments.
+        Segments are written before the hot store is rewritten; if we crash in
+        between, the next run skips orders that are already archived.
+        """
+        # Under payments_lock (see Archiver): re-read what other workers archived
+        self.load()
+        cutoff = ((now or datetime.now()) - timedelta(days=self.config['after_days'])).isoformat()
+        payments = load_payments()
+
+        by_month: Dict[str, List[Dict]] = {}
+        keep = []
+        for payment in payments:
+            if self.is_archivable(payment, cutoff):
+                if payment.get('order_id') not in self._orders:
+                    by_month.setdefault(payment['created_at'][:7], []).append(payment)
+            else:
+                keep.append(payment)
+
+        moved = len(payments) - len(keep)
+        if not moved:
+            return {'archived': 0, 'segments': 0, 'remaining': len(keep)}
+
+        for month, month_payments in sorted(by_month.items()):
+            name = self.write_segment(month, month_payments)
+            logger.info("Archived %d payments from %s into %s", len(month_payments), month, name)
+        save_payments(keep)
+        ARCHIVED.inc(amount=moved)
+        return {'archived': moved, 'segments': len(by_month), 'remaining': len(keep)}
+
+
+class Archiver:
+    """Periodic archive runs on the storage I/O pool, alongside the routers' own store writes"""
+
+    def __init__(self, load_payments: Callable[[], List[Dict]], save_payments: Callable[[List[Dict]], None],
+                 archive: Optional[PaymentArchive] = None):
+        self.load_payments = load_payments
+        self.save_payments = save_payments
+        self.archive = archive or payment_archive
+        self._task: Optional[asyncio.Task] = None
+
+    def _run_once(self) -> Dict[str, int]:
+        with payments_lock:
+            return self.archive.archive_once(self.load_payments, self.save_payments)
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                # payments_lock keeps the routers' own read-modify-write
+                # cycles from interleaving with ours
+                summary = await run_io('archive', self._run_once)
+                if summary['archived']:
+                    logger.info("Archive run: %s", summary, extra={'archive': summary})
+            except Exception as e:
+                logger.error("Archive run failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.archive.config['interval_seconds'])
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Shared by the payment routers (lookup fallback), exports and the admin indexes
+payment_archive = PaymentArchive()
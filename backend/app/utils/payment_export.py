@@ -0,0 +1,134 @@
+"""
+Streaming payment exports (CSV / JSONL, optionally gzipped) for accounting
+Rows are produced from payment_storage.iter_payments (preceded by archived
+segments overlapping the date range), so a million-row export uses the same
+memory as a ten-row one.
+
+CLI:
+    python -m app.utils.payment_export --format csv --from 2025-08-01 --to 2025-08-31 --gzip -o sierpien.csv.gz
+"""
+
+import io
+import csv
+import sys
+import json
+import zlib
+import argparse
+from itertools import chain
+from typing import Dict, Iterable, Iterator, Optional
+
+from .payment_storage import iter_payments, PAYMENTS_FILE
+from .payment_archive import payment_archive
+
+EXPORT_FIELDS = [
+    'payment_id', 'order_id', 'created_at', 'goal_id', 'amount', 'status',
+    'donor_name', 'donor_email', 'message', 'is_anonymous',
+    'transaction_id', 'approval_code', 'webhook_received',
+]
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Rows per yielded chunk; keeps per-chunk overhead low without buffering much
+ROWS_PER_CHUNK = 500
+
+
+def filter_payments(payments: Iterable[Dict], date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    goal_id: Optional[str] = None, status: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Filter by created_at date range (inclusive, YYYY-MM-DD), goal and status.
+    ISO timestamps sort lexicographically, so dates compare as strings.
+    """
+    for payment in payments:
+        created = (payment.get('created_at') or '')[:10]
+        if date_from and created < date_from:
+            continue
+        if date_to and created > date_to:
+            continue
+        if goal_id and payment.get('goal_id') != goal_id:
+            continue
+        if status and payment.get('status') != status:
+            continue
+        yield payment
+
+
+def csv_safe(value):
+    """Neutralize spreadsheet formulas in text cells (donor name, message, ...) with a leading quote"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(payments: Iterable[Dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    rows = 0
+    for payment in payments:
+        writer.writerow({field: csv_safe(payment.get(field)) for field in EXPORT_FIELDS})
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(payments: Iterable[Dict]) -> Iterator[str]:
+    lines = []
+    for payment in payments:
+        lines.append(json.dumps({field: payment.get(field) for field in EXPORT_FIELDS},
+                                ensure_ascii=False, default=str))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Incrementally gzip a stream of text chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_payments(fmt: str = 'csv', compress: bool = False, path: str = PAYMENTS_FILE,
+                    **filters) -> Iterator[bytes]:
+    """Byte stream of the filtered export, ready for a StreamingResponse or a file"""
+    archived = payment_archive.iter_payments(filters.get('date_from'), filters.get('date_to'))
+    payments = filter_payments(chain(archived, iter_payments(path)), **filters)
+    chunks = iter_csv(payments) if fmt == 'csv' else iter_jsonl(payments)
+    if compress:
+        return gzip_stream(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export payments for accounting")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--from', dest='date_from', help="First day, YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="Last day, YYYY-MM-DD")
+    parser.add_argument('--goal', dest='goal_id')
+    parser.add_argument('--status')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--input', default=PAYMENTS_FILE)
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    stream = export_payments(args.format, args.gzip, args.input, date_from=args.date_from,
+                             date_to=args.date_to, goal_id=args.goal_id, status=args.status)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+In-memory secondary indexes over the payments store for admin browsing
+Sorted key lists give keyset (cursor) pagination: a page is a bisect to the
+cursor plus `limit` steps, so page 10,000 costs the same as page 1. A
+TextIndex (payment_search) over the same records backs donor search, and
+PaymentColumns (payment_aggregates) backs the stats endpoints.
+
+The index is built lazily from the archive segments and the hot store, kept
+current by the payment routers after each write (record_write), and rebuilt
+when the hot store was changed by someone else (another worker, an archive
+run), detected via its mtime/size. Rebuilds read the whole store and the
+archive, so refresh() builds a fresh index on the storage I/O pool and swaps
+it in on the event loop; concurrent refreshes share one rebuild.
+"""
+
+import os
+import json
+import heapq
+import base64
+from itertools import chain
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .payment_storage import iter_payments, PAYMENTS_FILE
+from .payment_search import TextIndex
+from .payment_aggregates import PaymentColumns
+from .payment_record import PaymentRecord
+from .payment_archive import payment_archive
+from .storage_io import run_io
+from .singleflight import SingleFlight
+
+SORT_FIELDS = ('created_at', 'amount')
+
+# State replaced as a whole when a rebuilt index is swapped in
+_INDEX_STATE = ('_records', '_by_created', '_by_amount', '_by_status', '_by_goal', '_by_email',
+                'text', 'aggregates', '_stat', 'loaded')
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, key: Tuple) -> str:
+    raw = json.dumps([sort, list(key)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return tuple(key)
+
+
+def _created_key(payment: Dict) -> Tuple[str, str]:
+    return (payment.get('created_at') or '', payment.get('payment_id') or '')
+
+
+def _amount_key(payment: Dict) -> Tuple[float, str, str]:
+    return (float(payment.get('amount') or 0),) + _created_key(payment)
+
+
+class PaymentIndex:
+
+    def __init__(self, path: str = PAYMENTS_FILE):
+        self.path = path
+        self.loaded = False
+        self._stat: Optional[Tuple[int, int]] = None
+        self._rebuilds = SingleFlight('payment_index', window_seconds=0)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._records: Dict[str, PaymentRecord] = {}
+        self._by_created: List[Tuple[str, str]] = []
+        self._by_amount: List[Tuple[float, str, str]] = []
+        self._by_status: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_goal: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_email: Dict[str, List[Tuple[str, str]]] = {}
+        self.text = TextIndex()
+        self.aggregates = PaymentColumns()
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    # --- maintenance -------------------------------------------------------
+
+    def rebuild(self) -> None:
+        self._reset()
+        self._stat = self._file_stat()
+
+        def load():
+            # Archived first so a record present in both (crash mid-archive) keeps the hot copy
+            for payment in chain(payment_archive.iter_payments(), iter_payments(self.path)):
+                payment_id = payment.get('payment_id')
+                if payment_id:
+                    self._records[payment_id] = PaymentRecord.from_dict(payment)
+                    self.text.index(payment_id, payment)
+                    yield payment
+
+        self.aggregates.extend(load())
+        # Bulk build: one sort per list instead of repeated insort
+        records = self._records.values()
+        self._by_created = sorted(_created_key(p) for p in records)
+        self._by_amount = sorted(_amount_key(p) for p in records)
+        for payment in records:
+            key = _created_key(payment)
+            for bucket, value in self._secondary_values(payment):
+                bucket.setdefault(value, []).append(key)
+        for bucket in (self._by_status, self._by_goal, self._by_email):
+            for keys in bucket.values():
+                keys.sort()
+        self.text.sort_vocabulary()
+        self.loaded = True
+
+    def _secondary_values(self, payment: Dict):
+        yield self._by_status, payment.get('status') or 'unknown'
+        yield self._by_goal, payment.get('goal_id') or ''
+        email = (payment.get('donor_email') or '').lower()
+        if email:
+            yield self._by_email, email
+
+    @staticmethod
+    def _remove_key(keys: List, key: Tuple) -> None:
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def _remove(self, payment: Dict) -> None:
+        key = _created_key(payment)
+        self._remove_key(self._by_created, key)
+        self._remove_key(self._by_amount, _amount_key(payment))
+        for bucket, value in self._secondary_values(payment):
+            if value in bucket:
+                self._remove_key(bucket[value], key)
+
+    def _insert(self, payment: Dict) -> None:
+        key = _created_key(payment)
+        insort(self._by_created, key)
+        insort(self._by_amount, _amount_key(payment))
+        for bucket, value in self._secondary_values(payment):
+            insort(bucket.setdefault(value, []), key)
+
+    def upsert(self, payment: Dict) -> None:
+        payment_id = payment.get('payment_id')
+        if not payment_id:
+            return
+        old = self._records.get(payment_id)
+        if old is not None:
+            self._remove(old)
+        # A snapshot: callers keep mutating their dicts after saving
+        record = PaymentRecord.from_dict(payment)
+        self._records[payment_id] = record
+        self._insert(record)
+        self.text.index(payment_id, payment)
+        self.aggregates.upsert(payment)
+
+    def record_write(self, changed: Iterable[Dict]) -> None:
+        """Apply payments just written by this process and adopt the new file state"""
+        if not self.loaded:
+            return
+        for payment in changed:
+            self.upsert(payment)
+        self._stat = self._file_stat()
+
+    def _built(self) -> 'PaymentIndex':
+        fresh = PaymentIndex(self.path)
+        fresh.rebuild()
+        return fresh
+
+    async def _rebuild_off_loop(self) -> None:
+        fresh = await run_io('payment_index_rebuild', self._built)
+        # Writes recorded meanwhile changed the file stat: the next refresh rebuilds again
+        for name in _INDEX_STATE:
+            setattr(self, name, getattr(fresh, name))
+
+    async def refresh(self) -> None:
+        """Rebuild off the event loop if the store changed behind our back (or was never loaded)"""
+        if not self.loaded or self._file_stat() != self._stat:
+            await self._rebuilds.do('rebuild', self._rebuild_off_loop)
+
+    # --- queries -----------------------------------------------------------
+
+    def get(self, payment_id: str) -> Optional[Dict]:
+        record = self._records.get(payment_id)
+        return record.to_dict() if record is not None else None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def search(self, q: str, limit: int = 50) -> Tuple[List[Dict], int]:
+        """Newest payments matching a full-text query, plus the total match count"""
+        ids = self.text.search(q)
+        if len(ids) * 64 >= len(self._by_created):
+            # Broad match: walking newest-first finds `limit` hits within a
+            # few hundred steps, far cheaper than ranking every match
+            items = []
+            for key in reversed(self._by_created):
+                if key[-1] in ids:
+                    items.append(self._records[key[-1]].to_dict())
+                    if len(items) == limit:
+                        break
+            return items, len(ids)
+        records = (self._records[payment_id] for payment_id in ids if payment_id in self._records)
+        top = heapq.nlargest(limit, records, key=_created_key)
+        return [record.to_dict() for record in top], len(ids)
+
+    def query(self, sort: str = 'created_at', descending: bool = True, cursor: Optional[str] = None,
+              limit: int = 50, status: Optional[str] = None, goal_id: Optional[str] = None,
+              donor_email: Optional[str] = None, min_amount: Optional[float] = None,
+              max_amount: Optional[float] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of payments plus the cursor for the next page (None at the end).
+        The most selective available index drives the walk; remaining filters
+        are checked per record.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {sort}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        email = donor_email.lower() if donor_email else None
+
+        # Choose the driving key list
+        lo_bound = hi_bound = None
+        if sort == 'amount':
+            keys = self._by_amount
+            if min_amount is not None:
+                lo_bound = bisect_left(keys, (float(min_amount),))
+            if max_amount is not None:
+                hi_bound = bisect_right(keys, (float(max_amount), '\uffff'))
+        elif email:
+            keys = self._by_email.get(email, [])
+        elif status:
+            keys = self._by_status.get(status, [])
+        elif goal_id:
+            keys = self._by_goal.get(goal_id, [])
+        else:
+            keys = self._by_created
+
+        lo = lo_bound if lo_bound is not None else 0
+        hi = hi_bound if hi_bound is not None else len(keys)
+        if cursor:
+            cursor_key = decode_cursor(cursor, sort)
+            if descending:
+                hi = min(hi, bisect_left(keys, cursor_key))
+            else:
+                lo = max(lo, bisect_right(keys, cursor_key))
+
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        items: List[Dict] = []
+        last_key = None
+        more = False
+        for i in positions:
+            key = keys[i]
+            payment = self._records.get(key[-1])
+            if payment is None:
+                continue
+            if status and payment.get('status') != status:
+                continue
+            if goal_id and payment.get('goal_id') != goal_id:
+                continue
+            if email and (payment.get('donor_email') or '').lower() != email:
+                continue
+            amount = float(payment.get('amount') or 0)
+            if min_amount is not None and amount < min_amount:
+                continue
+            if max_amount is not None and amount > max_amount:
+                continue
+            if len(items) == limit:
+                more = True
+                break
+            items.append(payment.to_dict())
+            last_key = key
+
+        next_cursor = encode_cursor(sort, last_key) if more and last_key is not None else None
+        return items, next_cursor
+
+
+# Shared by the admin routes and the payment routers (which call record_write)
+payment_index = PaymentIndex()
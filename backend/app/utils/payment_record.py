@@ -0,0 +1,118 @@
+"""
+Compact in-memory payment record
+Payments cached by the admin indexes used to be kept as the dicts read from
+the store: a hash table with ~15 keys each. PaymentRecord is a slotted
+dataclass for the fields every payment has; statuses are PaymentStatus enum
+singletons and goal ids are interned, so millions of records share one copy
+of each. Anything else (debug fields, legacy keys) is kept as a compact JSON
+string and only decoded on demand.
+
+from_dict / to_dict convert to and from the storage format; to_dict returns
+the same keys and values that were read (key order may differ).
+"""
+
+import sys
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Union
+
+from ..models import PaymentStatus
+
+
+class _Missing:
+    """Marks a field that was absent from the stored dict (as opposed to null)"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+    def __bool__(self) -> bool:
+        return False
+
+
+MISSING: Any = _Missing()
+
+_STATUSES = {status.value: status for status in PaymentStatus}
+
+
+def _status(value):
+    if isinstance(value, str):
+        return _STATUSES.get(value) or sys.intern(value)
+    return value
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True, eq=False)
+class PaymentRecord:
+    payment_id: str = MISSING
+    order_id: str = MISSING
+    goal_id: str = MISSING
+    amount: Union[int, float] = MISSING
+    status: Union[PaymentStatus, str] = MISSING
+    created_at: str = MISSING
+    donor_name: Optional[str] = MISSING
+    donor_email: Optional[str] = MISSING
+    message: Optional[str] = MISSING
+    is_anonymous: bool = MISSING
+    txn_datetime: str = MISSING
+    transaction_id: Optional[str] = MISSING
+    approval_code: Optional[str] = MISSING
+    fail_reason: Optional[str] = MISSING
+    webhook_received: Optional[str] = MISSING
+    payment_completed: bool = MISSING
+    # Remaining keys, JSON-encoded
+    extra: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, payment: Dict) -> "PaymentRecord":
+        record = cls()
+        extra = None
+        for key, value in payment.items():
+            if key in _FIELDS:
+                if key == 'status':
+                    value = _status(value)
+                elif key == 'goal_id':
+                    value = _intern(value)
+                setattr(record, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        if extra:
+            record.extra = json.dumps(extra, ensure_ascii=False, separators=(',', ':'), default=str)
+        return record
+
+    def to_dict(self) -> Dict:
+        payment = {}
+        for key in _FIELD_ORDER:
+            value = getattr(self, key)
+            if value is not MISSING:
+                payment[key] = value.value if isinstance(value, PaymentStatus) else value
+        if self.extra:
+            payment.update(json.loads(self.extra))
+        return payment
+
+    def get(self, key: str, default=None):
+        """dict.get-compatible access, so readers of the old dicts keep working"""
+        if key in _FIELDS:
+            value = getattr(self, key)
+            if value is MISSING:
+                return default
+            return value.value if isinstance(value, PaymentStatus) else value
+        if self.extra:
+            return json.loads(self.extra).get(key, default)
+        return default
+
+    def __getitem__(self, key: str):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+
+# Storage keys held as attributes, in output order (and as a set for lookups)
+_FIELD_ORDER = tuple(name for name in PaymentRecord.__dataclass_fields__ if name != 'extra')
+_FIELDS = frozenset(_FIELD_ORDER)
@@ -0,0 +1,123 @@
+"""
+Full-text search over donors (name, email, intention message, order ID)
+An inverted index from normalized terms to payment IDs. Polish diacritics
+are folded (ą→a, ł→l, ...) on both sides, so "Kowalska Łucja" is found by
+"lucja kow". Every query term is a prefix: the sorted vocabulary is bisected
+to the first matching term and walked while terms still share the prefix.
+"""
+
+import re
+from bisect import bisect_left, insort
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+SEARCH_FIELDS = ('donor_name', 'donor_email', 'message', 'order_id')
+
+# Prefixes shorter than this only match whole terms; one letter would
+# otherwise expand to a large share of the vocabulary
+MIN_PREFIX_LENGTH = 2
+
+_FOLD = str.maketrans({
+    'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
+    'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+})
+_TERM = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    text = text.lower()
+    # translate() is comparatively slow; most emails and order IDs are ASCII
+    return text if text.isascii() else text.translate(_FOLD)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM.findall(normalize(text))
+
+
+def payment_terms(payment: Dict) -> FrozenSet[str]:
+    text = ' '.join(str(payment[field]) for field in SEARCH_FIELDS if payment.get(field))
+    return frozenset(tokenize(text))
+
+
+class TextIndex:
+    """Term -> payment IDs, updated one document at a time"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._doc_terms: Dict[str, FrozenSet[str]] = {}
+        # Sorted lazily after a bulk load, then maintained with insort
+        self._vocabulary: Optional[List[str]] = None
+
+    def index(self, doc_id: str, payment: Dict) -> None:
+        """Add or re-index a payment; unchanged text is a no-op"""
+        terms = payment_terms(payment)
+        old = self._doc_terms.get(doc_id)
+        if old is None:
+            old = frozenset()
+        elif terms == old:
+            return
+        for term in old - terms:
+            self._unlink(term, doc_id)
+        for term in terms - old:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = set()
+                if self._vocabulary is not None:
+                    insort(self._vocabulary, term)
+            postings.add(doc_id)
+        self._doc_terms[doc_id] = terms
+
+    def remove(self, doc_id: str) -> None:
+        for term in self._doc_terms.pop(doc_id, ()):
+            self._unlink(term, doc_id)
+
+    def _unlink(self, term: str, doc_id: str) -> None:
+        postings = self._postings.get(term)
+        if postings is None:
+            return
+        postings.discard(doc_id)
+        if not postings:
+            del self._postings[term]
+            if self._vocabulary is not None:
+                i = bisect_left(self._vocabulary, term)
+                if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                    del self._vocabulary[i]
+
+    def _expand(self, prefix: str) -> Iterable[Set[str]]:
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            postings = self._postings.get(prefix)
+            return [postings] if postings else []
+        if self._vocabulary is None:
+            self.sort_vocabulary()
+        vocabulary = self._vocabulary
+        matches = []
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            matches.append(self._postings[vocabulary[i]])
+            i += 1
+        return matches
+
+    def sort_vocabulary(self) -> None:
+        """Sort the vocabulary after a bulk load instead of on the first query"""
+        self._vocabulary = sorted(self._postings)
+
+    def search(self, query: str) -> Set[str]:
+        """IDs of payments matching every query term (each as a prefix)"""
+        candidates: List[Set[str]] = []
+        for prefix in set(tokenize(query)):
+            matches = self._expand(prefix)
+            if not matches:
+                return set()
+            candidates.append(matches[0] if len(matches) == 1 else set().union(*matches))
+        if not candidates:
+            return set()
+        # Intersect smallest first so the working set only shrinks
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for ids in candidates[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
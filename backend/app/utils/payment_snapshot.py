@@ -0,0 +1,199 @@
+"""
+Columnar snapshots of payment history for reporting
+write_snapshot streams every payment (archive segments, then the hot store)
+into typed columns and saves them as one compressed NumPy .npz file:
+
+    amount   int64           grosze, so sums are exact
+    created  int64           wall-clock seconds since 1970-01-01 (timestamps
+                             are stored naive, so no timezone is applied)
+    goal     int32 codes     into goal_values
+    status   int8 codes      into status_values
+
+PaymentSnapshot loads those arrays and answers per-goal / per-month
+aggregates with bincount over the codes instead of looping over dicts.
+
+CLI:
+    python -m app.utils.payment_snapshot write
+    python -m app.utils.payment_snapshot report --year 2025
+"""
+
+import os
+import sys
+import json
+import argparse
+from array import array
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+from .payment_storage import iter_payments, PAYMENTS_FILE
+from .payment_archive import payment_archive
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for snapshots/reports
+    np = None
+
+SNAPSHOT_FILE = os.getenv('PAYMENT_SNAPSHOT_FILE', 'data/snapshots/payments.npz')
+EPOCH = datetime(1970, 1, 1)
+
+# 'completed' is written by the older payment routers
+SUCCESS_STATUSES = ('approved', 'completed')
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("numpy is required for payment snapshots")
+
+
+def epoch_seconds(created_at: Optional[str]) -> int:
+    # Wall clock, like numpy's datetime64: months computed from it match the stored dates
+    try:
+        return int((datetime.fromisoformat(created_at).replace(tzinfo=None) - EPOCH).total_seconds())
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Dictionary:
+    """Value -> dense integer code, in first-seen order"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def build_columns(payments: Iterable[Dict]) -> Dict[str, "np.ndarray"]:
+    """Encode payments into typed columns; memory grows by ~15 bytes per payment"""
+    _require_numpy()
+    amounts = array('q')
+    created = array('q')
+    goals = array('i')
+    statuses = array('b')
+    goal_dict = _Dictionary()
+    status_dict = _Dictionary()
+
+    for payment in payments:
+        amounts.append(round(float(payment.get('amount') or 0) * 100))
+        created.append(epoch_seconds(payment.get('created_at')))
+        goals.append(goal_dict.encode(payment.get('goal_id') or ''))
+        statuses.append(status_dict.encode(payment.get('status') or 'unknown'))
+
+    return {
+        'amount': np.frombuffer(amounts, dtype=np.int64),
+        'created': np.frombuffer(created, dtype=np.int64),
+        'goal': np.frombuffer(goals, dtype=np.int32),
+        'status': np.frombuffer(statuses, dtype=np.int8),
+        'goal_values': np.array(goal_dict.values, dtype=str),
+        'status_values': np.array(status_dict.values, dtype=str),
+    }
+
+
+def write_snapshot(path: str = SNAPSHOT_FILE, payments: Optional[Iterable[Dict]] = None) -> int:
+    """Snapshot all payments (archive + hot store by default); returns the row count"""
+    if payments is None:
+        payments = chain(payment_archive.iter_payments(), iter_payments(PAYMENTS_FILE))
+    columns = build_columns(payments)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # np.savez appends .npz to names without it; keep the temp name explicit
+    temp_file = f"{path}.tmp.npz"
+    np.savez_compressed(temp_file, **columns)
+    os.replace(temp_file, path)
+    return len(columns['amount'])
+
+
+class PaymentSnapshot:
+    """Read side: vectorized aggregates over a snapshot"""
+
+    def __init__(self, columns: Dict[str, "np.ndarray"]):
+        _require_numpy()
+        self.amount = columns['amount']
+        self.created = columns['created']
+        self.goal = columns['goal']
+        self.status = columns['status']
+        self.goal_values = [str(v) for v in columns['goal_values']]
+        self.status_values = [str(v) for v in columns['status_values']]
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_FILE) -> "PaymentSnapshot":
+        _require_numpy()
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def mask(self, statuses: Optional[Iterable[str]] = SUCCESS_STATUSES, year: Optional[int] = None) -> "np.ndarray":
+        """Row filter by status names and calendar year"""
+        selected = np.ones(len(self.amount), dtype=bool)
+        if statuses is not None:
+            codes = [self.status_values.index(s) for s in statuses if s in self.status_values]
+            selected &= np.isin(self.status, codes)
+        if year is not None:
+            start = epoch_seconds(f"{year}-01-01")
+            end = epoch_seconds(f"{year + 1}-01-01")
+            selected &= (self.created >= start) & (self.created < end)
+        return selected
+
+    def by_goal(self, statuses: Optional[Iterable[str]] = SUCCESS_STATUSES,
+                year: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        selected = self.mask(statuses, year)
+        goal = self.goal[selected]
+        size = len(self.goal_values)
+        counts = np.bincount(goal, minlength=size)
+        totals = np.bincount(goal, weights=self.amount[selected], minlength=size)
+        return {
+            self.goal_values[code]: {'count': int(counts[code]), 'total': round(float(totals[code]) / 100, 2)}
+            for code in np.flatnonzero(counts)
+        }
+
+    def by_month(self, statuses: Optional[Iterable[str]] = SUCCESS_STATUSES,
+                 year: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        selected = self.mask(statuses, year)
+        months = self.created[selected].astype('datetime64[s]').astype('datetime64[M]')
+        keys, inverse = np.unique(months, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        totals = np.bincount(inverse, weights=self.amount[selected], minlength=len(keys))
+        return {
+            str(key): {'count': int(count), 'total': round(float(total) / 100, 2)}
+            for key, count, total in zip(keys, counts, totals)
+        }
+
+    def by_status(self, year: Optional[int] = None) -> Dict[str, int]:
+        counts = np.bincount(self.status[self.mask(None, year)], minlength=len(self.status_values))
+        return {self.status_values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar payment snapshots and reports")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    write = subcommands.add_parser('write', help="Write a snapshot of all payments")
+    write.add_argument('-o', '--output', default=SNAPSHOT_FILE)
+    report = subcommands.add_parser('report', help="Per-goal and per-month totals from a snapshot")
+    report.add_argument('-i', '--input', default=SNAPSHOT_FILE)
+    report.add_argument('--year', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'write':
+        rows = write_snapshot(args.output)
+        print(f"Wrote {rows} payments to {args.output}")
+        return
+
+    snapshot = PaymentSnapshot.load(args.input)
+    json.dump({
+        'payments': len(snapshot),
+        'by_status': snapshot.by_status(args.year),
+        'by_goal': snapshot.by_goal(year=args.year),
+        'by_month': snapshot.by_month(year=args.year),
+    }, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
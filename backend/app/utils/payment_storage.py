@@ -0,0 +1,63 @@
+"""
+Read access to the payments store for bulk consumers (exports, listings)
+The store is a single JSON array; iter_payments walks it record by record
+with an incremental decoder instead of json.load()ing the whole file, so
+memory stays bounded by one read chunk plus one record.
+"""
+
+import os
+import re
+import json
+from typing import Dict, Iterator
+
+PAYMENTS_FILE = "data/payments.json"
+READ_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_SKIP_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_SKIP_SEPARATORS = re.compile(r'[ \t\n\r,]*')
+
+
+def iter_payments(path: str = PAYMENTS_FILE, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """Yield payment records one at a time from a JSON array file"""
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skip separators between records
+            pos = (_SKIP_SEPARATORS if started else _SKIP_WHITESPACE).match(buffer, pos).end()
+            if not started and pos < len(buffer):
+                if buffer[pos] != '[':
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+
+            if pos < len(buffer):
+                try:
+                    record, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    record = None
+                if record is not None:
+                    pos = end
+                    yield record
+                    continue
+
+            if eof:
+                return
+            # Need more input: drop consumed text and read the next chunk
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
@@ -0,0 +1,277 @@
+"""
+Reconciliation of stale pending payments
+Payments whose S2S notification never arrived are looked up at the gateway
+in bounded-concurrency batches, and the results are applied through the
+same update function the S2S webhook uses. That function re-reads each
+record under the store lock and only settles orders that are still pending:
+a webhook (or another worker) may have settled one while it was looked up.
+The pending index is resynced from the store at the start of every run, as
+other workers add and settle orders this process never hears about.
+"""
+
+import os
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .fiserv_gateway import fiserv_gateway, FiservGatewayClient, GatewayError
+from .metrics import registry
+from .storage_io import run_io
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CONFIG = {
+    'enabled': os.getenv('RECONCILE_ENABLED', 'false').lower() == 'true',
+    'provider': os.getenv('RECONCILE_PROVIDER', 'fiserv'),  # fiserv | mock
+    'interval_seconds': float(os.getenv('RECONCILE_INTERVAL_SECONDS', '300')),
+    'stale_minutes': float(os.getenv('RECONCILE_STALE_MINUTES', '30')),
+    # Orders the gateway still doesn't know after this long were abandoned
+    'expire_minutes': float(os.getenv('RECONCILE_EXPIRE_MINUTES', '1440')),
+    'batch_size': int(os.getenv('RECONCILE_BATCH_SIZE', '200')),
+    'concurrency': int(os.getenv('RECONCILE_CONCURRENCY', '10')),
+}
+
+# Stored statuses the reconciler may still change
+RECONCILABLE_STATUSES = ('pending', 'waiting')
+
+# Gateway statuses that settle a payment; anything else stays pending
+TERMINAL_STATUSES = {'APPROVED', 'DECLINED', 'FAILED', 'EXPIRED'}
+
+RECONCILED = registry.counter(
+    "payment_reconciliation_results_total",
+    "Stale pending payments looked up by the reconciler, by outcome",
+    ("outcome",),
+)
+RECONCILE_PENDING = registry.gauge(
+    "payment_reconciliation_pending",
+    "Payments currently indexed as pending",
+)
+
+
+def _timestamp(created_at: str) -> float:
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PendingIndex:
+    """
+    Pending payments ordered by creation time, so selecting the ones older
+    than a cutoff is a bisect plus a slice instead of a scan of the store
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[float, str]] = []
+        self._created: Dict[str, float] = {}
+        self.loaded = False
+
+    def rebuild(self, payments: Iterable[Dict]) -> None:
+        self._created = {
+            p['order_id']: _timestamp(p.get('created_at'))
+            for p in payments
+            if p.get('status') in RECONCILABLE_STATUSES and p.get('order_id')
+        }
+        self._entries = sorted((ts, order_id) for order_id, ts in self._created.items())
+        self.loaded = True
+        RECONCILE_PENDING.set(len(self._entries))
+
+    def add(self, order_id: str, created_at: str) -> None:
+        if order_id in self._created:
+            return
+        ts = _timestamp(created_at)
+        self._created[order_id] = ts
+        insort(self._entries, (ts, order_id))
+        RECONCILE_PENDING.set(len(self._entries))
+
+    def discard(self, order_id: str) -> None:
+        ts = self._created.pop(order_id, None)
+        if ts is None:
+            return
+        i = bisect_left(self._entries, (ts, order_id))
+        if i < len(self._entries) and self._entries[i] == (ts, order_id):
+            del self._entries[i]
+        RECONCILE_PENDING.set(len(self._entries))
+
+    def older_than(self, cutoff: datetime) -> List[Tuple[float, str]]:
+        return self._entries[:bisect_left(self._entries, (cutoff.timestamp(), ''))]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._created
+
+
+# Shared by the payment routers (maintained on initiate/update) and the reconciler
+pending_index = PendingIndex()
+
+
+class StatusProvider(ABC):
+    """
+    Looks up the current gateway status of an order. Returns a dict shaped
+    like an S2S notification (oid, status, approval_code, ipgTransactionId,
+    fail_reason) or None when the gateway has no record of the order.
+    """
+
+    @abstractmethod
+    async def fetch_status(self, order_id: str) -> Optional[Dict[str, str]]:
+        ...
+
+
+class FiservStatusProvider(StatusProvider):
+    """Order inquiry through the Fiserv REST API"""
+
+    def __init__(self, client: FiservGatewayClient = fiserv_gateway):
+        self.client = client
+
+    async def fetch_status(self, order_id: str) -> Optional[Dict[str, str]]:
+        response = await self.client.request('GET', f"/orders/{order_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+        transactions = data.get('transactions') or [data]
+        latest = transactions[-1]
+        processor = latest.get('processor') or {}
+        return {
+            'oid': order_id,
+            'status': (latest.get('transactionStatus') or latest.get('transactionState') or '').upper(),
+            'approval_code': latest.get('approvalCode') or processor.get('approvalCode'),
+            'ipgTransactionId': latest.get('ipgTransactionId'),
+            'fail_reason': latest.get('errorMessage') or processor.get('responseMessage'),
+        }
+
+
+class MockStatusProvider(StatusProvider):
+    """Local stand-in: fixed statuses per order, with a default for the rest"""
+
+    def __init__(self, statuses: Optional[Dict[str, str]] = None, default: Optional[str] = 'APPROVED',
+                 latency: float = 0.0):
+        self.statuses = statuses or {}
+        self.default = default
+        self.latency = latency
+
+    async def fetch_status(self, order_id: str) -> Optional[Dict[str, str]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        status = self.statuses.get(order_id, self.default)
+        if status is None:
+            return None
+        return {'oid': order_id, 'status': status, 'ipgTransactionId': f"MOCK-{order_id}"}
+
+
+ApplyUpdates = Callable[[List[Dict[str, str]]], Awaitable[List[str]]]
+
+
+class Reconciler:
+    """
+    Periodically settles stale pending payments.
+
+    apply_updates receives a batch of notification-shaped dicts and must
+    persist them exactly like the S2S webhook would (one load/save per batch,
+    off the event loop).
+    """
+
+    def __init__(self, provider: StatusProvider, apply_updates: ApplyUpdates,
+                 load_payments: Callable[[], List[Dict]], index: PendingIndex = pending_index,
+                 config: Optional[Dict] = None):
+        self.provider = provider
+        self.apply_updates = apply_updates
+        self.load_payments = load_payments
+        self.index = index
+        self.config = {**RECONCILE_CONFIG, **(config or {})}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _lookup(self, semaphore: asyncio.Semaphore, order_id: str) -> Tuple[str, Optional[Dict], bool]:
+        async with semaphore:
+            try:
+                return order_id, await self.provider.fetch_status(order_id), True
+            except GatewayError as e:
+                logger.warning("Reconciliation lookup failed for %s: %s", order_id, e)
+            except Exception as e:
+                logger.error("Reconciliation lookup error for %s: %s", order_id, e, exc_info=True)
+            return order_id, None, False
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Reconcile every pending payment older than stale_minutes"""
+        now = now or datetime.now()
+        # Resync every run: other workers' initiates and settlements aren't in our index
+        self.index.rebuild(await run_io('load_payments', self.load_payments))
+
+        stale = self.index.older_than(now - timedelta(minutes=self.config['stale_minutes']))
+        expire_before = (now - timedelta(minutes=self.config['expire_minutes'])).timestamp()
+        summary = {'checked': 0, 'settled': 0, 'still_pending': 0, 'expired': 0, 'skipped': 0, 'errors': 0}
+        semaphore = asyncio.Semaphore(self.config['concurrency'])
+        batch_size = self.config['batch_size']
+
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            created = {order_id: ts for ts, order_id in batch}
+            results = await asyncio.gather(*(self._lookup(semaphore, order_id) for _, order_id in batch))
+
+            updates = []
+            for order_id, result, ok in results:
+                summary['checked'] += 1
+                if not ok:
+                    summary['errors'] += 1
+                    RECONCILED.inc('error')
+                elif result and result.get('status') in TERMINAL_STATUSES:
+                    updates.append(result)
+                elif result is None and created[order_id] < expire_before:
+                    updates.append({'oid': order_id, 'status': 'EXPIRED',
+                                    'fail_reason': 'No gateway record, payment abandoned'})
+                else:
+                    summary['still_pending'] += 1
+                    RECONCILED.inc('still_pending')
+
+            if updates:
+                applied = set(await self.apply_updates(updates))
+                for update in updates:
+                    if update['oid'] not in applied:
+                        # Settled elsewhere (or gone) since the index was read
+                        summary['skipped'] += 1
+                        RECONCILED.inc('skipped')
+                        self.index.discard(update['oid'])
+                        continue
+                    if update['status'] == 'EXPIRED':
+                        summary['expired'] += 1
+                    else:
+                        summary['settled'] += 1
+                    RECONCILED.inc(update['status'].lower())
+                    # The apply path normally drops settled orders already
+                    self.index.discard(update['oid'])
+
+        if summary['checked']:
+            logger.info("Reconciliation run: %s", summary, extra={'reconciliation': summary})
+        return summary
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Reconciliation run failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.config['interval_seconds'])
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def build_provider(name: str = RECONCILE_CONFIG['provider']) -> StatusProvider:
+    if name == 'mock':
+        return MockStatusProvider()
+    return FiservStatusProvider()
@@ -0,0 +1,243 @@
+"""
+HTTP response cache for read-mostly public endpoints
+The organization and bootstrap endpoints and the root document only change
+when a donation is approved or organization.json is edited, so their
+serialized bodies are kept in memory, keyed by path and query string, and
+served without calling the route handler.
+
+Every entry is stamped with a version: a counter bumped by invalidate()
+(the payment routers call it when payments are approved) plus the mtimes of
+watched files (organization.json). A request whose version differs from the
+entry's recomputes it. A server-side TTL bounds staleness for changes made
+by other worker processes.
+
+Responses carry a strong ETag (hash of the body) and Cache-Control with
+max-age and stale-while-revalidate; If-None-Match requests matching the
+current entry get a 304 without touching the handler.
+
+The handler's other headers are kept with the entry and replayed on hits.
+
+Entries are compressed at most once per encoding (at the static levels, as
+the cost is shared by every hit) and the compressed copy is kept with the
+entry; each encoding gets its own ETag.
+"""
+
+import os
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .metrics import registry
+from .compression import add_vary, compressible, compress_measured, negotiate, record_response
+
+RESPONSE_CACHE_CONFIG = {
+    'enabled': os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true',
+    'max_age': int(os.getenv('RESPONSE_CACHE_MAX_AGE', '30')),
+    'stale_while_revalidate': int(os.getenv('RESPONSE_CACHE_STALE_WHILE_REVALIDATE', '300')),
+    # Server-side revalidation interval (changes made by other workers)
+    'ttl_seconds': float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '60')),
+    'max_entries': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512')),
+}
+
+# GET /, /api/organization, /api/organization/stats, /api/organization/goal/{goal_id},
+# /api/bootstrap, /api/bootstrap/{goal_id}
+CACHEABLE_PATHS = re.compile(r'^/(api/(organization(/stats|/goal/[^/]+)?|bootstrap(/[^/]+)?))?$')
+
+# Set by _respond itself rather than replayed from the handler's response
+REPLACED_HEADERS = {b'content-length', b'content-encoding', b'content-type', b'etag', b'cache-control', b'vary'}
+
+CACHE_REQUESTS = registry.counter(
+    "response_cache_requests_total",
+    "Cacheable requests by route template and result (hit, miss, not_modified)",
+    ("route", "result"),
+)
+CACHE_INVALIDATIONS = registry.counter(
+    "response_cache_invalidations_total",
+    "Response cache invalidations, by reason",
+    ("reason",),
+)
+CACHE_ENTRIES = registry.gauge(
+    "response_cache_entries",
+    "Responses held in the cache",
+)
+
+
+class CachedResponse:
+    __slots__ = ('body', 'status_code', 'media_type', 'headers', 'vary', 'etag', 'version', 'stored_at',
+                 'route', 'encoded')
+
+    def __init__(self, body: bytes, status_code: int, media_type: Optional[str],
+                 version: Tuple, route, raw_headers: Iterable[Tuple[bytes, bytes]] = ()):
+        self.body = body
+        self.status_code = status_code
+        self.media_type = media_type
+        raw_headers = list(raw_headers)
+        self.headers = [(k, v) for k, v in raw_headers if k.lower() not in REPLACED_HEADERS]
+        self.vary = ', '.join(v.decode('latin-1') for k, v in raw_headers if k.lower() == b'vary')
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.version = version
+        self.stored_at = time.monotonic()
+        self.route = route
+        # encoding -> compressed body, None when compressing doesn't pay
+        self.encoded: Dict[str, Optional[bytes]] = {}
+
+    def compressible(self) -> bool:
+        return compressible(self.media_type, len(self.body))
+
+    def variant(self, encoding: str) -> Optional[bytes]:
+        """Body compressed with `encoding`, compressed on first use only"""
+        if encoding not in self.encoded:
+            encoded = compress_measured(self.body, encoding, 'cached')
+            self.encoded[encoding] = encoded if len(encoded) < len(self.body) else None
+        return self.encoded[encoding]
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """If-None-Match uses weak comparison: W/"x" matches "x" """
+    if not if_none_match:
+        return False
+    etags = set(etags)
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') in etags:
+            return True
+    return False
+
+
+def _route_label(route, path: str) -> str:
+    # Route template, so /goal/{goal_id} is one label rather than one per goal
+    return getattr(route, 'path', None) or path
+
+
+class ResponseCache:
+
+    def __init__(self, config: Dict = RESPONSE_CACHE_CONFIG):
+        self.config = config
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._version = 0
+        self._watched: List[str] = []
+        self.cache_control = (
+            f"public, max-age={config['max_age']}, "
+            f"stale-while-revalidate={config['stale_while_revalidate']}"
+        )
+
+    def watch(self, path: str) -> None:
+        """Treat changes to a file (by mtime) as an invalidation"""
+        if path not in self._watched:
+            self._watched.append(path)
+
+    def invalidate(self, reason: str) -> None:
+        """Make every cached response stale (e.g. after a payment approval)"""
+        self._version += 1
+        CACHE_INVALIDATIONS.inc(reason)
+
+    def version(self) -> Tuple:
+        mtimes = []
+        for path in self._watched:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return (self._version, *mtimes)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        CACHE_ENTRIES.set(0)
+
+    def lookup(self, key: str, version: Tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version or time.monotonic() - entry.stored_at > self.config['ttl_seconds']:
+            del self._entries[key]
+            CACHE_ENTRIES.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.config['max_entries']:
+            self._entries.popitem(last=False)
+        CACHE_ENTRIES.set(len(self._entries))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rate across all cached routes (from the Prometheus counters)"""
+        totals = {'hit': 0, 'miss': 0, 'not_modified': 0}
+        for (_, result), value in CACHE_REQUESTS.samples().items():
+            totals[result] = totals.get(result, 0) + value
+        requests = sum(totals.values())
+        served = totals['hit'] + totals['not_modified']
+        return {**totals, 'entries': len(self._entries),
+                'hit_rate': round(served / requests, 4) if requests else 0}
+
+    def _respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {'Cache-Control': self.cache_control}
+        if entry.vary:
+            headers['vary'] = entry.vary
+        body, encoding = entry.body, None
+        if entry.compressible():
+            add_vary(headers, 'Accept-Encoding')
+            encoding = negotiate(request.headers.get('accept-encoding'))
+            encoded = entry.variant(encoding) if encoding is not None else None
+            if encoded is None:
+                encoding = None
+            else:
+                body = encoded
+                headers['Content-Encoding'] = encoding
+        headers['ETag'] = entry.etag_for(encoding)
+        # Any representation's ETag validates: the content behind them is the same
+        etags = [entry.etag, *(entry.etag_for(e) for e, v in entry.encoded.items() if v is not None)]
+        if _etag_matches(request.headers.get('if-none-match'), etags):
+            headers.pop('Content-Encoding', None)
+            response = Response(status_code=304, headers=headers)
+        else:
+            if encoding is not None:
+                record_response(encoding, 'cached', len(entry.body), len(body))
+            response = Response(content=body, status_code=entry.status_code,
+                                media_type=entry.media_type, headers=headers)
+        response.raw_headers.extend(entry.headers)
+        return response
+
+    async def middleware(self, request: Request, call_next):
+        """HTTP middleware: serve cacheable GETs from memory, fill on miss"""
+        path = request.url.path
+        if (not self.config['enabled'] or request.method != 'GET'
+                or not CACHEABLE_PATHS.match(path)):
+            return await call_next(request)
+
+        key = f"{path}?{request.url.query}" if request.url.query else path
+        version = self.version()
+        entry = self.lookup(key, version)
+        if entry is not None:
+            # Keep the route template visible to the latency middleware
+            request.scope['route'] = entry.route
+            response = self._respond(request, entry)
+            CACHE_REQUESTS.inc(_route_label(entry.route, path),
+                               'not_modified' if response.status_code == 304 else 'hit')
+            return response
+
+        response = await call_next(request)
+        route = request.scope.get('route')
+        if response.status_code != 200:
+            return response
+        body = b''.join([chunk async for chunk in response.body_iterator])
+        entry = CachedResponse(body, response.status_code, response.headers.get('content-type'), version, route,
+                               response.raw_headers)
+        self.store(key, entry)
+        response = self._respond(request, entry)
+        CACHE_REQUESTS.inc(_route_label(route, path),
+                           'not_modified' if response.status_code == 304 else 'miss')
+        return response
+
+
+# Create singleton instance
+response_cache = ResponseCache()
@@ -0,0 +1,139 @@
+"""
+JSON codecs for the file stores and API responses
+orjson when it is installed (compact output, no pretty-printing on the hot
+path), the stdlib json module otherwise. Files are read and written as
+UTF-8 bytes, so the stores are interchangeable between the two backends.
+
+JSON_STORAGE_FORMAT=pretty keeps indent=2 output for people who read
+data/*.json by hand; the default is compact.
+
+Compatibility check for existing stores (exit status 1 on any mismatch):
+    python -m app.utils.serialization data/payments.json
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Any, Iterator, List
+
+try:
+    import orjson
+except ImportError:  # optional dependency, stdlib json is used without it
+    orjson = None
+
+STORAGE_FORMAT = os.getenv('JSON_STORAGE_FORMAT', 'compact')  # compact | pretty
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Large lists are encoded this many items at a time (see _iter_list_chunks)
+ENCODE_CHUNK_ITEMS = 2048
+
+
+def _default(value: Any) -> str:
+    # Same fallback the stores used with json.dump(default=str)
+    return str(value)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            # Integers beyond 64 bits and non-str keys: fall through to stdlib
+            pass
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_default).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def _iter_list_chunks(items: list) -> Iterator[bytes]:
+    """
+    Compact encoding of a long list, a chunk at a time; the concatenation is
+    byte-identical to dumps(items). Encoding and writing chunk by chunk
+    releases the GIL in between (and never builds the whole document in
+    memory), so the event loop keeps running while an I/O thread rewrites a
+    large store.
+    """
+    yield b'['
+    for i in range(0, len(items), ENCODE_CHUNK_ITEMS):
+        if i:
+            yield b','
+        yield dumps(items[i:i + ENCODE_CHUNK_ITEMS])[1:-1]
+    yield b']'
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """Parse a JSON file; `default` when it does not exist"""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def write_json(path: str, obj: Any, atomic: bool = True) -> None:
+    """Write obj in the configured storage format, via temp file + rename by default"""
+    if STORAGE_FORMAT != 'pretty' and isinstance(obj, list) and len(obj) > ENCODE_CHUNK_ITEMS:
+        chunks = _iter_list_chunks(obj)
+    else:
+        chunks = [dumps(obj, pretty=STORAGE_FORMAT == 'pretty')]
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    target = path if not atomic else f"{path}.tmp"
+    with open(target, 'wb') as f:
+        f.writelines(chunks)
+    if atomic:
+        os.replace(target, path)
+
+
+def legacy_dumps(obj: Any) -> bytes:
+    """The stores' previous format: json.dump(obj, f, indent=2)"""
+    return json.dumps(obj, indent=2).encode('utf-8')
+
+
+def check_file(path: str) -> List[str]:
+    """
+    Verify that a store written by the old code survives the new codecs:
+    - the fast decoder reads exactly what the stdlib decoder reads
+    - compact and pretty encodings decode back to equal values
+    - re-encoding in the legacy format reproduces the file byte for byte
+    Returns a list of problems (empty when compatible).
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    problems = []
+    reference = json.loads(raw)
+    decoded = loads(raw)
+    if decoded != reference:
+        problems.append(f"{BACKEND} decodes differently from the stdlib json module")
+    for pretty in (False, True):
+        if loads(dumps(decoded, pretty=pretty)) != reference:
+            problems.append(f"{'pretty' if pretty else 'compact'} encoding does not round-trip")
+    if legacy_dumps(decoded) != raw:
+        problems.append("legacy re-encoding is not byte-identical (file not written by json.dump(indent=2)?)")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check JSON store compatibility with the fast codecs")
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for path in args.paths:
+        problems = check_file(path)
+        failed = failed or bool(problems)
+        status = 'ok' if not problems else 'FAILED'
+        print(f"{path}: {status} ({BACKEND})")
+        for problem in problems:
+            print(f"  - {problem}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Singleflight request coalescing
+When a church screen refresh and a hundred phones ask for the stats at the
+same moment, each request would load and aggregate the data on its own.
+SingleFlight.do(key, fn) runs fn once per key at a time: callers arriving
+while it runs await the same result. With a window (SINGLEFLIGHT_WINDOW_MS)
+the result is also kept that long, so a storm spread over a few hundred
+milliseconds still costs about one computation.
+
+Keys should carry whatever version the result depends on (e.g.
+response_cache.version()) so a data change is never answered from the
+window. The computation runs in its own task: a caller that disconnects
+doesn't cancel it for the others. Failures are shared but not kept.
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from .metrics import registry
+
+T = TypeVar('T')
+
+SINGLEFLIGHT_CONFIG = {
+    'window_seconds': int(os.getenv('SINGLEFLIGHT_WINDOW_MS', '500')) / 1000,
+}
+
+SINGLEFLIGHT_REQUESTS = registry.counter(
+    "singleflight_requests_total",
+    "Coalesced reads by group and result (computed, coalesced, cached)",
+    ("group", "result"),
+)
+SINGLEFLIGHT_FAN_IN = registry.histogram(
+    "singleflight_fan_in",
+    "Callers served by one computation, by group",
+    ("group",),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+
+class _Call:
+    __slots__ = ('task', 'fan_in')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.fan_in = 1
+
+
+class SingleFlight:
+
+    def __init__(self, group: str, window_seconds: Optional[float] = None):
+        self.group = group
+        self.window = SINGLEFLIGHT_CONFIG['window_seconds'] if window_seconds is None else window_seconds
+        self._calls: Dict[Hashable, _Call] = {}
+        # key -> (expires_at, result)
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Result of fn() for `key`, shared with concurrent (and, within the window, recent) callers"""
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                SINGLEFLIGHT_REQUESTS.inc(self.group, 'cached')
+                return cached[1]
+            del self._results[key]
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.get_running_loop().create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            SINGLEFLIGHT_REQUESTS.inc(self.group, 'computed')
+        else:
+            call.fan_in += 1
+            SINGLEFLIGHT_REQUESTS.inc(self.group, 'coalesced')
+        # shield: a caller giving up must not cancel the shared computation
+        return await asyncio.shield(call.task)
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        del self._calls[key]
+        SINGLEFLIGHT_FAN_IN.observe(call.fan_in, self.group)
+        # exception() also marks a failure nobody waited for as retrieved
+        if call.task.cancelled() or call.task.exception() is not None or self.window <= 0:
+            return
+        now = time.monotonic()
+        for stale in [k for k, (expires_at, _) in self._results.items() if expires_at <= now]:
+            del self._results[stale]
+        self._results[key] = (now + self.window, call.task.result())
+
+    def forget(self, key: Hashable) -> None:
+        self._results.pop(key, None)
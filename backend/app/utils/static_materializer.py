@@ -0,0 +1,282 @@
+"""
+Static materialization of the public read API
+Organization, goal, stats and bootstrap JSON and the goal QR codes change
+only when a payment is approved or organization.json is edited, yet every
+request for them travels nginx -> uvicorn -> Python. The materializer
+renders these responses in-process (same bytes the API would send) and
+writes them below MATERIALIZE_DIR whenever the response cache version
+changes:
+
+    api/organization.json          (+ .gz, .br)
+    api/organization/stats.json
+    api/organization/goal/<id>.json
+    api/organization/qr/<id>.png
+    api/bootstrap.json, api/bootstrap/<id>.json
+
+Every file is written to a temp name and renamed into place, so nginx never
+serves a partial file; unchanged files are left alone and files of removed
+goals are deleted. nginx-materialized.conf, written next to them, serves
+these paths with try_files and falls back to the API for anything missing:
+
+    server {
+        ...
+        include /var/www/simplepaymentgate/backend/public/nginx-materialized.conf;
+    }
+
+One-off run and snippet (from the backend directory):
+    python -m app.utils.static_materializer --out public
+"""
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+
+from .metrics import registry
+from .compression import precompress, SUFFIXES
+from .response_cache import response_cache
+from .storage_io import run_io
+from . import lanes
+
+logger = logging.getLogger(__name__)
+
+MATERIALIZE_CONFIG = {
+    'enabled': os.getenv('MATERIALIZE_ENABLED', 'false').lower() == 'true',
+    'directory': os.getenv('MATERIALIZE_DIR', 'public'),
+    # How often the data version is checked
+    'interval_seconds': float(os.getenv('MATERIALIZE_INTERVAL_SECONDS', '2')),
+    # Re-render at least this often (approvals handled by other workers)
+    'refresh_seconds': float(os.getenv('MATERIALIZE_REFRESH_SECONDS', '60')),
+    # Public path of the API in nginx (/bramkamvp/api behind the subdirectory proxy)
+    'location_prefix': os.getenv('MATERIALIZE_LOCATION_PREFIX', '/api'),
+    'upstream': os.getenv('MATERIALIZE_UPSTREAM', 'http://127.0.0.1:8000'),
+    # brotli_static needs the ngx_brotli module
+    'nginx_brotli': os.getenv('MATERIALIZE_NGINX_BROTLI', 'false').lower() == 'true',
+}
+
+SNIPPET_FILE = 'nginx-materialized.conf'
+
+EXTENSIONS = {'application/json': '.json', 'image/png': '.png'}
+# Already compressed formats get no .gz/.br variants
+COMPRESSIBLE = {'.json'}
+
+MATERIALIZE_RUNS = registry.counter(
+    "materialize_runs_total",
+    "Static materialization runs, by result (ok, failed)",
+    ("result",),
+)
+MATERIALIZE_FILES = registry.counter(
+    "materialize_files_total",
+    "Files considered by materialization runs, by result (written, unchanged, kept, removed)",
+    ("result",),
+)
+MATERIALIZE_DURATION = registry.histogram(
+    "materialize_duration_seconds",
+    "Time to render and write the static API files",
+)
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Atomically replace path with data unless it already holds exactly that"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def remove_stale(root: str, keep: Set[str]) -> int:
+    """Delete files below root that the last run neither produced nor kept (e.g. removed goals)"""
+    removed = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            # '.tmp.': another worker's write in progress
+            if path not in keep and '.tmp.' not in name:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def nginx_snippet(directory: str, location_prefix: str = '/api', upstream: str = 'http://127.0.0.1:8000',
+                  cache_control: Optional[str] = None, brotli_static: bool = False) -> str:
+    root = os.path.abspath(directory)
+    prefix = location_prefix.rstrip('/')
+    cache_control = cache_control or response_cache.cache_control
+    brotli_line = "    brotli_static on;\n" if brotli_static else ""
+    return f"""# Generated by app.utils.static_materializer - do not edit
+# Public read API served from materialized files; missing files fall back to the API
+
+location ~ ^{prefix}/(organization|organization/stats|organization/goal/[^/]+|bootstrap|bootstrap/[^/]+)$ {{
+    root {root};
+    default_type application/json;
+    gzip_static on;
+{brotli_line}    add_header Cache-Control "{cache_control}";
+    try_files /api/$1.json @materialized_api;
+}}
+
+location ~ ^{prefix}/(organization/qr/[^/]+)$ {{
+    root {root};
+    default_type image/png;
+    add_header Cache-Control "{cache_control}";
+    try_files /api/$1.png @materialized_api;
+}}
+
+location @materialized_api {{
+    rewrite ^{prefix}/(.*)$ /api/$1 break;
+    proxy_pass {upstream};
+    proxy_http_version 1.1;
+    proxy_set_header Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+}}
+"""
+
+
+class Materializer:
+    """Renders the public read endpoints of `app` in-process and writes them as static files"""
+
+    def __init__(self, app, config: Dict = MATERIALIZE_CONFIG):
+        self.app = app
+        self.config = config
+        self.directory = config['directory']
+        self._task: Optional[asyncio.Task] = None
+        self._version = None
+        self._rendered_at = 0.0
+
+    async def _render(self, client: httpx.AsyncClient, path: str) -> Optional[httpx.Response]:
+        response = await client.get(path)
+        if response.status_code != 200:
+            logger.warning("Materializing %s: HTTP %s", path, response.status_code)
+            return None
+        return response
+
+    def _write(self, path: str, response: httpx.Response, written: Set[str]) -> None:
+        extension = EXTENSIONS[response.headers['content-type'].split(';')[0].strip()]
+        target = os.path.join(self.directory, path.lstrip('/') + extension)
+        files = {target: response.content}
+        if extension in COMPRESSIBLE:
+            for encoding, encoded in precompress(response.content).items():
+                files[target + SUFFIXES[encoding]] = encoded
+        # Plain file last: nginx only looks for variants of a file that exists
+        for file_path in sorted(files, key=lambda p: p == target):
+            changed = write_if_changed(file_path, files[file_path])
+            MATERIALIZE_FILES.inc('written' if changed else 'unchanged')
+            written.add(file_path)
+
+    def _keep_previous(self, path: str, written: Set[str]) -> None:
+        # A failed render keeps serving the last good files rather than falling back
+        base = os.path.join(self.directory, path.lstrip('/'))
+        directory, prefix = os.path.dirname(base), os.path.basename(base) + '.'
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix) and '.tmp.' not in name:
+                MATERIALIZE_FILES.inc('kept')
+                written.add(os.path.join(directory, name))
+
+    def _write_all(self, responses: Dict[str, Optional[httpx.Response]]) -> Tuple[Set[str], int]:
+        written: Set[str] = set()
+        for path, response in responses.items():
+            if response is not None:
+                self._write(path, response, written)
+            else:
+                self._keep_previous(path, written)
+        removed = remove_stale(os.path.join(self.directory, 'api'), written)
+        if removed:
+            MATERIALIZE_FILES.inc('removed', amount=removed)
+        write_if_changed(os.path.join(self.directory, SNIPPET_FILE), self.snippet().encode('utf-8'))
+        return written, removed
+
+    async def run_once(self) -> Dict[str, int]:
+        start = time.perf_counter()
+        version = response_cache.version()
+        transport = httpx.ASGITransport(app=self.app)
+        # identity: the compressed variants are produced below, at static levels
+        async with httpx.AsyncClient(transport=transport, base_url='http://materializer',
+                                     headers={'Accept-Encoding': 'identity'}) as client:
+            organization = await self._render(client, '/api/organization')
+            if organization is None:
+                raise RuntimeError("organization endpoint unavailable")
+            goal_ids = [goal['id'] for goal in organization.json()['goals']]
+            paths = ['/api/organization/stats', '/api/bootstrap']
+            for goal_id in goal_ids:
+                paths += [f'/api/organization/goal/{goal_id}', f'/api/organization/qr/{goal_id}',
+                          f'/api/bootstrap/{goal_id}']
+            responses = {'/api/organization': organization}
+            for path in paths:
+                responses[path] = await self._render(client, path)
+
+        # Compression and file writes run on the background lane's pool
+        token = lanes.current_lane.set(lanes.background)
+        try:
+            written, removed = await run_io('materialize', self._write_all, responses)
+        finally:
+            lanes.current_lane.reset(token)
+
+        self._version = version
+        self._rendered_at = time.monotonic()
+        MATERIALIZE_DURATION.observe(time.perf_counter() - start)
+        return {'files': len(written), 'removed': removed}
+
+    def snippet(self) -> str:
+        return nginx_snippet(self.directory, self.config['location_prefix'], self.config['upstream'],
+                             brotli_static=self.config['nginx_brotli'])
+
+    def stale(self) -> bool:
+        return (self._version != response_cache.version()
+                or time.monotonic() - self._rendered_at > self.config['refresh_seconds'])
+
+    async def run_forever(self) -> None:
+        while True:
+            if self.stale():
+                try:
+                    await self.run_once()
+                    MATERIALIZE_RUNS.inc('ok')
+                except Exception as e:
+                    MATERIALIZE_RUNS.inc('failed')
+                    logger.error("Static materialization failed: %s", e, exc_info=True)
+                    # Retry on the next refresh rather than every interval
+                    self._version = response_cache.version()
+                    self._rendered_at = time.monotonic()
+            await asyncio.sleep(self.config['interval_seconds'])
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write the public read API as static files plus an nginx snippet")
+    parser.add_argument('--out', default=MATERIALIZE_CONFIG['directory'])
+    parser.add_argument('--location-prefix', default=MATERIALIZE_CONFIG['location_prefix'])
+    args = parser.parse_args()
+
+    from main import app
+    materializer = Materializer(app, {**MATERIALIZE_CONFIG, 'directory': args.out,
+                                      'location_prefix': args.location_prefix})
+    print(asyncio.run(materializer.run_once()))
+    print(f"nginx snippet: {os.path.join(args.out, SNIPPET_FILE)}")
@@ -0,0 +1,217 @@
+"""
+Blocking file I/O off the event loop
+The JSON stores are read and rewritten with plain open/read/os.replace. Done
+inside an async handler, one slow write or fsync stalls every request of the
+worker, so handlers hand these calls to run_io(), which runs them on a small
+dedicated thread pool (not the default executor shared with everything else)
+and records per-operation queue wait, duration and queue depth. Requests
+running in a priority lane (see lanes.py) use that lane's pool instead.
+
+payments_lock serializes read-modify-write cycles of the payments store
+between those threads, the archiver and other worker processes: with the
+event loop no longer running them back to back, two rewrites of the whole
+file would otherwise race and the last one would win. BatchWriter
+group-commits those cycles: mutations submitted while a rewrite is running
+are applied together by the next one, so updates to different orders share
+one load and one save instead of queueing for the lock one by one.
+
+Benchmark (status-poll latency while the store is being rewritten):
+    python -m app.utils.storage_io --payments 200000
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .metrics import registry
+from .locks import StoreLock
+from .lanes import current_lane, lane_executor
+from .payment_storage import PAYMENTS_FILE
+
+T = TypeVar('T')
+
+STORAGE_IO_CONFIG = {
+    'workers': int(os.getenv('STORAGE_IO_WORKERS', '4')),
+}
+
+STORAGE_IO_DURATION = registry.histogram(
+    "storage_io_duration_seconds",
+    "Time spent running blocking storage operations, by operation",
+    ("operation",),
+)
+STORAGE_IO_WAIT = registry.histogram(
+    "storage_io_queue_wait_seconds",
+    "Time storage operations waited for a free I/O thread, by operation",
+    ("operation",),
+)
+STORAGE_IO_QUEUE_DEPTH = registry.gauge(
+    "storage_io_queue_depth",
+    "Storage operations submitted but not yet running",
+)
+STORAGE_IO_ACTIVE = registry.gauge(
+    "storage_io_active",
+    "Storage operations currently running",
+)
+BATCH_SIZE = registry.histogram(
+    "storage_batch_size",
+    "Mutations applied per group-committed store rewrite, by store",
+    ("store",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+# Held around load-modify-save of data/payments.json (routers, archiver, other workers)
+payments_lock = StoreLock(PAYMENTS_FILE)
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_CONFIG['workers'], thread_name_prefix='storage-io')
+
+
+async def run_io(operation: str, fn: Callable[..., T], *args) -> T:
+    """Run fn(*args) on the current lane's pool (default: storage I/O pool); contextvars (tracing) carry over"""
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+    STORAGE_IO_QUEUE_DEPTH.inc()
+
+    def call():
+        started = time.perf_counter()
+        STORAGE_IO_QUEUE_DEPTH.dec()
+        STORAGE_IO_ACTIVE.inc()
+        STORAGE_IO_WAIT.observe(started - submitted, operation)
+        try:
+            return context.run(fn, *args)
+        finally:
+            STORAGE_IO_ACTIVE.dec()
+            STORAGE_IO_DURATION.observe(time.perf_counter() - started, operation)
+
+    return await asyncio.get_running_loop().run_in_executor(lane_executor() or _executor, call)
+
+
+class BatchWriter:
+    """
+    Group commit for a whole-file store. submit(mutate) queues a function
+    that modifies the loaded data in place; one rewrite applies every
+    queued mutation in order (on the storage I/O pool, under `lock`) and
+    saves once. A mutation that raises is skipped and its caller gets the
+    exception; the others are still committed.
+    """
+
+    def __init__(self, store: str, load: Callable[[], Any], save: Callable[[Any], None], lock: StoreLock):
+        self.store = store
+        self.load = load
+        self.save = save
+        self.lock = lock
+        self._pending: List[Tuple[Callable, Optional[Callable], asyncio.Future]] = []
+        self._draining = False
+
+    async def submit(self, mutate: Callable[[Any], T], on_commit: Optional[Callable[[T], None]] = None) -> T:
+        """Apply mutate(data) and persist it; on_commit(result) runs after the save, under the lock"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((mutate, on_commit, future))
+        if not self._draining:
+            self._draining = True
+            asyncio.get_running_loop().create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        # Commits serve every lane: don't inherit the lane of whoever started the drain
+        current_lane.set(None)
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    results = await run_io(f"{self.store}_commit", self._commit, batch)
+                except BaseException as e:
+                    results = [(False, e)] * len(batch)
+                for (_, _, future), (ok, value) in zip(batch, results):
+                    if future.done():
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        finally:
+            self._draining = False
+
+    def _commit(self, batch) -> List[Tuple[bool, Any]]:
+        BATCH_SIZE.observe(len(batch), self.store)
+        with self.lock:
+            data = self.load()
+            results = []
+            for mutate, _, _ in batch:
+                try:
+                    results.append((True, mutate(data)))
+                except Exception as e:
+                    results.append((False, e))
+            if any(ok for ok, _ in results):
+                self.save(data)
+                for (_, on_commit, _), (ok, value) in zip(batch, results):
+                    if ok and on_commit is not None:
+                        on_commit(value)
+        return results
+
+
+def shutdown() -> None:
+    """Let queued writes finish; called on application shutdown"""
+    _executor.shutdown(wait=True)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return {'p50_ms': round(pick(0.5) * 1000, 2), 'p99_ms': round(pick(0.99) * 1000, 2),
+            'max_ms': round(samples[-1] * 1000, 2)}
+
+
+async def _measure(offload: bool, payments: List[Dict], path: str, seconds: float) -> Dict:
+    from .serialization import write_json
+
+    stop = time.perf_counter() + seconds
+    saves = 0
+    latencies: List[float] = []
+
+    async def saver():
+        nonlocal saves
+        while time.perf_counter() < stop:
+            if offload:
+                await run_io('benchmark_save', write_json, path, payments)
+            else:
+                write_json(path, payments)
+            saves += 1
+            await asyncio.sleep(0)
+
+    async def poller():
+        # A status poll answered from memory: its latency is event-loop delay
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            latencies.append(time.perf_counter() - start - 0.005)
+
+    await asyncio.gather(saver(), *(poller() for _ in range(20)))
+    return {'saves': saves, 'polls': len(latencies), **_percentiles(latencies)}
+
+
+def benchmark(count: int, seconds: float = 3.0) -> Dict[str, Dict]:
+    payments = [{
+        'payment_id': f"p{i}", 'order_id': f"ORD-20250101-{i:08d}", 'goal_id': 'church',
+        'amount': 50.0, 'status': 'approved', 'created_at': '2025-01-01T12:00:00',
+        'donor_name': 'Jan Kowalski', 'donor_email': 'jan@example.com', 'message': None,
+    } for i in range(count)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payments.json')
+        return {
+            'on_event_loop': asyncio.run(_measure(False, payments, path, seconds)),
+            'storage_executor': asyncio.run(_measure(True, payments, path, seconds)),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Poll latency during store rewrites: inline vs. I/O executor")
+    parser.add_argument('--payments', type=int, default=200_000)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+    for mode, result in benchmark(args.payments, args.seconds).items():
+        print(mode, result)
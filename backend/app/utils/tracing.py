@@ -0,0 +1,305 @@
+"""
+Lightweight payment tracing
+Follows one order (oid) across initiate -> donor return/status polling ->
+S2S notification. Spans are kept in an in-memory ring buffer of traces and
+can be exported as JSONL or as OTLP/JSON (the OpenTelemetry file format).
+A trace holds at most TRACE_MAX_SPANS_PER_ORDER spans: a donor polling the
+status for an hour would otherwise grow one trace without bound. The spans
+of the first request (initiate) are kept and the oldest later ones dropped.
+
+Traces live in the server process; to write some to a file from the backend
+directory (pulled through /api/debug/trace, ADMIN_API_TOKEN required):
+    python -m app.utils.tracing ORD-... --format otlp --out traces.json
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List
+
+import httpx
+
+from .metrics import PAYMENT_STAGE_LATENCY, registry
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+TRACE_MAX_ORDERS = int(os.getenv('TRACE_MAX_ORDERS', '5000'))
+TRACE_MAX_SPANS_PER_ORDER = int(os.getenv('TRACE_MAX_SPANS_PER_ORDER', '200'))
+SERVICE_NAME = 'simple-charity-mvp'
+# Not __name__: that is __main__ when exporting from the command line
+SCOPE_NAME = 'app.utils.tracing'
+
+TRACE_SPANS_DROPPED = registry.counter(
+    "trace_spans_dropped_total",
+    "Spans evicted from traces that reached TRACE_MAX_SPANS_PER_ORDER",
+)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar('current_span', default=None)
+
+
+def trace_id_for(order_id: str) -> str:
+    """Deterministic 128-bit trace id so every request for an oid joins one trace"""
+    return hashlib.sha256(order_id.encode('utf-8')).hexdigest()[:32]
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent', 'root', 'order_id', 'start_ns',
+                 'end_ns', 'attributes', 'collected')
+
+    def __init__(self, name: str, parent: Optional["Span"], order_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.order_id = order_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        # Finished child spans, only used on the root span
+        self.collected: List["Span"] = []
+
+    def bind(self, order_id: str) -> None:
+        """Attach the order id once known (e.g. generated mid-handler)"""
+        self.root.order_id = order_id
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self, order_id: str) -> Dict:
+        return {
+            'trace_id': trace_id_for(order_id),
+            'span_id': self.span_id,
+            'parent_span_id': self.parent.span_id if self.parent else None,
+            'order_id': order_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+        }
+
+
+class TraceBuffer:
+    """Ring buffer of traces keyed by order id; the oldest order is evicted first"""
+
+    def __init__(self, max_orders: int = TRACE_MAX_ORDERS, max_spans: int = TRACE_MAX_SPANS_PER_ORDER):
+        self.max_orders = max_orders
+        self.max_spans = max_spans
+        self._traces: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        # order id -> spans of its first request, never evicted
+        self._heads: Dict[str, int] = {}
+
+    def record(self, root: Span) -> None:
+        order_id = root.order_id
+        if not order_id:
+            return
+        spans = self._traces.get(order_id)
+        new = spans is None
+        if new:
+            spans = self._traces[order_id] = []
+            if len(self._traces) > self.max_orders:
+                evicted, _ = self._traces.popitem(last=False)
+                self._heads.pop(evicted, None)
+        spans.append(root.to_dict(order_id))
+        spans.extend(child.to_dict(order_id) for child in root.collected)
+        if new:
+            self._heads[order_id] = min(len(spans), self.max_spans // 2)
+        overflow = len(spans) - self.max_spans
+        if overflow > 0:
+            head = self._heads[order_id]
+            del spans[head:head + overflow]
+            TRACE_SPANS_DROPPED.inc(amount=overflow)
+
+    def get(self, order_id: str) -> List[Dict]:
+        return sorted(self._traces.get(order_id, []), key=lambda s: s['start_ns'])
+
+    def order_ids(self) -> List[str]:
+        return list(self._traces.keys())
+
+    def load(self, order_id: str, spans: List[Dict]) -> None:
+        """Put already-rendered spans (e.g. fetched from another process) in the buffer"""
+        self._traces[order_id] = list(spans)
+
+
+buffer = TraceBuffer()
+
+
+@contextmanager
+def trace_span(name: str, order_id: Optional[str] = None, **attributes):
+    """
+    Open a span. Without an active parent this starts a root span that is
+    recorded (with all its children) into the buffer when it finishes.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    span = Span(name, parent, order_id, attributes)
+    if order_id and parent:
+        span.bind(order_id)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.attributes['error'] = repr(e)
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if parent is None:
+            buffer.record(span)
+        else:
+            span.root.collected.append(span)
+
+
+@contextmanager
+def stage_span(handler: str, stage: str):
+    """
+    Time an internal handler stage once and report it both to the
+    payment_stage_duration_seconds histogram and as a child span
+    """
+    parent = _current_span.get() if TRACING_ENABLED else None
+    span = Span(stage, parent, None, {'handler': handler}) if parent else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PAYMENT_STAGE_LATENCY.observe(time.perf_counter() - start, handler, stage)
+        if span is not None:
+            span.end_ns = time.time_ns()
+            span.root.collected.append(span)
+
+
+def traced(name: str):
+    """Decorator opening a root span around an async route handler"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_order(order_id: Optional[str]) -> None:
+    """Attach the order id to the active trace, if any"""
+    span = _current_span.get()
+    if span is not None and order_id:
+        span.bind(order_id)
+
+
+def annotate(key: str, value) -> None:
+    """Set an attribute on the active span, if any"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(key, value)
+
+
+class _NoopSpan:
+    def bind(self, order_id: str) -> None:
+        pass
+
+    def set(self, key: str, value) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def settlement_latency_ms(spans: List[Dict]) -> Optional[float]:
+    """Time from the start of initiate to the end of the first S2S notification"""
+    initiate = next((s for s in spans if s['name'] == 'payment.initiate'), None)
+    webhook = next((s for s in spans if s['name'] == 'payment.s2s_webhook'), None)
+    if not initiate or not webhook:
+        return None
+    return round((webhook['end_ns'] - initiate['start_ns']) / 1e6, 3)
+
+
+def to_jsonl(spans: List[Dict]) -> str:
+    return ''.join(json.dumps(span, default=str) + '\n' for span in spans)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Render spans as an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': SCOPE_NAME},
+                'spans': [
+                    {
+                        'traceId': span['trace_id'],
+                        'spanId': span['span_id'],
+                        'parentSpanId': span['parent_span_id'] or '',
+                        'name': span['name'],
+                        'kind': 2,  # SPAN_KIND_SERVER
+                        'startTimeUnixNano': str(span['start_ns']),
+                        'endTimeUnixNano': str(span['end_ns']),
+                        'attributes': [
+                            {'key': key, 'value': _otlp_value(value)}
+                            for key, value in {'order_id': span['order_id'], **span['attributes']}.items()
+                        ],
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+
+def export_to_file(path: str, fmt: str = 'jsonl', order_ids: Optional[List[str]] = None) -> int:
+    """
+    Append buffered traces to a file, one JSONL span per line or one
+    OTLP/JSON request per line (the OTel collector file exporter layout).
+    Returns the number of spans written.
+    """
+    written = 0
+    with open(path, 'a') as f:
+        for order_id in order_ids or buffer.order_ids():
+            spans = buffer.get(order_id)
+            if not spans:
+                continue
+            if fmt == 'otlp':
+                f.write(json.dumps(to_otlp(spans), default=str) + '\n')
+            else:
+                f.write(to_jsonl(spans))
+            written += len(spans)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export traces of a running server as JSONL or OTLP/JSON")
+    parser.add_argument('order_ids', nargs='+')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--token', default=os.getenv('ADMIN_API_TOKEN', ''))
+    parser.add_argument('--format', choices=('jsonl', 'otlp'), default='jsonl')
+    parser.add_argument('--out', default='traces.jsonl')
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url, headers={'X-Admin-Token': args.token}) as client:
+        for order_id in args.order_ids:
+            response = client.get(f"/api/debug/trace/{order_id}")
+            if response.status_code == 404:
+                print(f"{order_id}: no trace recorded")
+                continue
+            response.raise_for_status()
+            buffer.load(order_id, response.json()['spans'])
+    print(f"{export_to_file(args.out, args.format, args.order_ids)} spans -> {args.out}")
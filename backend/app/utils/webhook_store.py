@@ -0,0 +1,72 @@
+"""
+Side store for raw gateway notification payloads
+Full S2S parameter sets are large and only needed for audits, so payment
+records keep just a reference id. Payloads are appended to a JSONL file
+(one {"id", "order_id", "received_at", "params"} object per line); an id ->
+offset map, built on first read, makes get() one seek and one line read.
+"""
+
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PAYLOADS_FILE = os.getenv('WEBHOOK_PAYLOADS_FILE', 'data/webhook_payloads.jsonl')
+
+
+class WebhookPayloadStore:
+
+    def __init__(self, path: str = WEBHOOK_PAYLOADS_FILE):
+        self.path = path
+        self._offsets: Optional[Dict[str, int]] = None
+
+    def _load_offsets(self) -> Dict[str, int]:
+        offsets: Dict[str, int] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        offsets[json.loads(line)['id']] = offset
+                    except (ValueError, KeyError):
+                        logger.warning(f"Skipping unreadable webhook payload at offset {offset}")
+                    offset += len(line)
+        return offsets
+
+    def put(self, params: Dict, order_id: Optional[str] = None) -> str:
+        """Append a payload and return its reference id"""
+        payload_id = uuid.uuid4().hex
+        line = json.dumps({
+            'id': payload_id,
+            'order_id': order_id,
+            'received_at': datetime.now().isoformat(),
+            'params': params,
+        }, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+        if self._offsets is not None:
+            self._offsets[payload_id] = offset
+        return payload_id
+
+    def get(self, payload_id: str) -> Optional[Dict]:
+        if self._offsets is None:
+            self._offsets = self._load_offsets()
+        offset = self._offsets.get(payload_id)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def get_many(self, payload_ids: List[str]) -> List[Dict]:
+        return [payload for payload in map(self.get, payload_ids) if payload is not None]
+
+
+# Create singleton instance
+webhook_payloads = WebhookPayloadStore()
@@ -15,6 +15,8 @@ import uuid
 import logging
 from collections import OrderedDict
 
+from app.utils.logging_setup import setup_logging, lazy_json
+
 # Konfiguracja
 FISERV_CONFIG = {
     "storename": "760995999",
@@ -24,7 +26,7 @@ FISERV_CONFIG = {
 }
 
 # Konfiguracja logowania
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Fiserv Payment Fixed")
@@ -281,7 +283,7 @@ async def prepare_payment(
     # Logowanie dla debugowania
     logger.info(f"Order created: {order_id}")
     logger.info(f"Timestamp: {txndatetime} (future: +1 min)")
-    logger.info(f"All parameters being sent: {json.dumps(all_params, indent=2)}")
+    logger.debug("All parameters being sent: %s", lazy_json(all_params, indent=2))
     
     # Generowanie formularza HTML z automatycznym przekierowaniem
     form_fields = "".join([
@@ -369,7 +371,7 @@ async def prepare_payment(
 async def payment_success(request: Request):
     """Strona sukcesu płatności"""
     params = dict(request.query_params)
-    logger.info(f"Payment success callback received: {json.dumps(params, indent=2)}")
+    logger.info("Payment success callback received: %s", lazy_json(params))
     
     # Aktualizuj status zamówienia jeśli mamy OID
     if "oid" in params:
@@ -450,7 +452,7 @@ async def payment_success(request: Request):
 async def payment_fail(request: Request):
     """Strona błędu płatności"""
     params = dict(request.query_params)
-    logger.info(f"Payment fail callback received: {json.dumps(params, indent=2)}")
+    logger.info("Payment fail callback received: %s", lazy_json(params))
     
     # Aktualizuj status zamówienia jeśli mamy OID
     if "oid" in params:
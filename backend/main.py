@@ -1,22 +1,68 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, ORJSONResponse
 import os
+import time
 from dotenv import load_dotenv
 
-from app.routes import organization
+# Load environment variables (before app modules read their *_CONFIG at import)
+load_dotenv()
+
+from app.routes import organization, bootstrap, debug, admin
+from app.routes import payments_production
 from app.routes.payments_production import router as payments_router
+from app.utils import metrics
+from app.utils.logging_setup import setup_logging
+from app.utils.fiserv_gateway import fiserv_gateway
+from app.utils.reconciliation import Reconciler, RECONCILE_CONFIG, build_provider
+from app.utils.email_dispatcher import email_dispatcher
+from app.utils.payment_archive import Archiver, ARCHIVE_CONFIG
+from app.utils import serialization
+from app.utils.response_cache import response_cache
+from app.utils.admission import admission
+from app.utils import storage_io, lanes, compression
+from app.utils.static_materializer import Materializer, MATERIALIZE_CONFIG
+from app.utils.assets import AssetFiles, asset_pipeline, ASSET_CONFIG
 
-# Load environment variables
-load_dotenv()
+# Move log formatting and I/O off the event loop
+setup_logging()
 
 app = FastAPI(
     title="Simple Charity MVP",
     description="Single organization charity donation platform",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson renders response bodies several times faster than json.dumps
+    default_response_class=ORJSONResponse if serialization.orjson is not None else JSONResponse
 )
 
-# Configure CORS
+# Shed non-critical load early under overload (inside the cache: hits are cheap)
+app.middleware("http")(admission.middleware)
+
+# Organization endpoints and root served from memory with ETag/304
+# (registered before the latency middleware so it wraps cache hits too)
+app.middleware("http")(response_cache.middleware)
+
+# gzip/brotli for the remaining JSON responses (cache entries come precompressed)
+app.middleware("http")(compression.middleware)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request latency per route template (not per raw path)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start, request.method, route_path, str(status)
+        )
+
+# Configure CORS (registered last: outermost, so cached and shed responses get
+# the headers for each request's own Origin too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -33,14 +79,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/assets", StaticFiles(directory="static"), name="static")
+# Mount static files: hashed/negotiated WebP/AVIF and precompressed variants
+# from the asset build, plain files from static/ otherwise
+app.mount("/assets", AssetFiles(directory="static", pipeline=asset_pipeline), name="static")
 
 # Include routers
 app.include_router(organization.router)
+app.include_router(bootstrap.router)
 app.include_router(payments_router)
+app.include_router(debug.router)
+app.include_router(admin.router)
 
 @app.get("/")
+@lanes.normal
 async def root():
     return {
         "message": "Simple Charity MVP API",
@@ -52,6 +103,52 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+# Settles payments whose S2S notification never arrived
+reconciler = Reconciler(
+    provider=build_provider(),
+    apply_updates=payments_production.reconcile_status_updates,
+    load_payments=payments_production.load_payments,
+)
+
+# Moves old settled payments out of the hot store into compressed segments
+archiver = Archiver(
+    load_payments=payments_production.load_payments,
+    save_payments=payments_production.save_payments,
+)
+
+# Writes the public read endpoints as static files for nginx
+materializer = Materializer(app)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    if RECONCILE_CONFIG['enabled']:
+        reconciler.start()
+    if email_dispatcher.config['enabled']:
+        email_dispatcher.start()
+    if ARCHIVE_CONFIG['enabled']:
+        archiver.start()
+    if MATERIALIZE_CONFIG['enabled']:
+        materializer.start()
+    if ASSET_CONFIG['build_on_startup']:
+        asset_pipeline.start()
+
+@app.on_event("shutdown")
+async def close_outbound_clients():
+    """Stop background jobs and close pooled connections to the payment gateway"""
+    await reconciler.stop()
+    await email_dispatcher.stop()
+    await archiver.stop()
+    await materializer.stop()
+    await asset_pipeline.stop()
+    await fiserv_gateway.aclose()
+    storage_io.shutdown()
+    lanes.shutdown()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
\ No newline at end of file
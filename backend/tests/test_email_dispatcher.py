@@ -0,0 +1,147 @@
+"""
+Email dispatcher against a local aiosmtpd sink
+Run from the backend directory (pip install -r requirements-dev.txt):
+    python -m pytest tests/test_email_dispatcher.py
+"""
+
+import json
+import time
+import socket
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosmtplib")
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+from app.utils.email_dispatcher import EmailDispatcher
+
+REFUSED = 'refused@example.com'
+
+
+class SinkHandler:
+    """Accepts everything except mail to REFUSED"""
+
+    def __init__(self):
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return '550 5.1.1 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.extend(envelope.rcpt_tos)
+        return '250 Message accepted for delivery'
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    handler = SinkHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    try:
+        yield handler, controller.port
+    finally:
+        controller.stop()
+
+
+@pytest.fixture
+def make_dispatcher(tmp_path):
+    def make(port: int = 1, **config) -> EmailDispatcher:
+        return EmailDispatcher({
+            'smtp_host': '127.0.0.1', 'smtp_port': port, 'smtp_username': '',
+            'smtp_starttls': False, 'outbox_file': str(tmp_path / 'outbox.json'), **config,
+        })
+    return make
+
+
+def test_batch_is_sent_over_one_connection(smtp_sink, make_dispatcher):
+    handler, port = smtp_sink
+    dispatcher = make_dispatcher(port)
+
+    async def run():
+        for i in range(3):
+            await dispatcher.enqueue(f"donor{i}@example.com", "Potwierdzenie", "Dziękujemy")
+        return await dispatcher.send_batch()
+
+    assert asyncio.run(run()) == 3
+    assert sorted(handler.delivered) == [f"donor{i}@example.com" for i in range(3)]
+    assert dispatcher.outbox == []
+
+
+def test_refused_recipient_only_retries_itself(smtp_sink, make_dispatcher, tmp_path):
+    handler, port = smtp_sink
+    dispatcher = make_dispatcher(port)
+
+    async def run():
+        await dispatcher.enqueue("first@example.com", "Potwierdzenie", "Dziękujemy")
+        await dispatcher.enqueue(REFUSED, "Potwierdzenie", "Dziękujemy")
+        await dispatcher.enqueue("third@example.com", "Potwierdzenie", "Dziękujemy")
+        return await dispatcher.send_batch()
+
+    assert asyncio.run(run()) == 2
+    assert sorted(handler.delivered) == ["first@example.com", "third@example.com"]
+    assert [(m['to'], m['attempts']) for m in dispatcher.outbox] == [(REFUSED, 1)]
+    assert dispatcher.outbox[0]['next_attempt_at'] > time.time()
+    # Persisted as well
+    with open(tmp_path / 'outbox.json') as f:
+        assert [m['to'] for m in json.load(f)] == [REFUSED]
+
+
+def test_unreachable_server_retries_whole_batch(make_dispatcher):
+    dispatcher = make_dispatcher(_free_port())
+
+    async def run():
+        await dispatcher.enqueue("first@example.com", "Potwierdzenie", "Dziękujemy")
+        await dispatcher.enqueue("second@example.com", "Potwierdzenie", "Dziękujemy")
+        return await dispatcher.send_batch()
+
+    assert asyncio.run(run()) == 0
+    assert [m['attempts'] for m in dispatcher.outbox] == [1, 1]
+
+
+def test_outbox_survives_restart(make_dispatcher):
+    asyncio.run(make_dispatcher().enqueue("donor@example.com", "Potwierdzenie", "Dziękujemy"))
+    assert [m['to'] for m in make_dispatcher().outbox] == ["donor@example.com"]
+
+
+def test_workers_sharing_the_outbox_keep_each_others_messages(smtp_sink, make_dispatcher, tmp_path):
+    handler, port = smtp_sink
+    first, second = make_dispatcher(port), make_dispatcher(port)
+
+    async def run():
+        await first.enqueue("first@example.com", "Potwierdzenie", "Dziękujemy")
+        await second.enqueue("second@example.com", "Potwierdzenie", "Dziękujemy")
+        return await first.send_batch()
+
+    assert asyncio.run(run()) == 1
+    assert handler.delivered == ["first@example.com"]
+    with open(tmp_path / 'outbox.json') as f:
+        assert [m['to'] for m in json.load(f)] == ["second@example.com"]
+
+
+def test_dead_messages_are_pruned_after_retention(smtp_sink, make_dispatcher):
+    _, port = smtp_sink
+    dispatcher = make_dispatcher(port, max_attempts=1, dead_retention_seconds=60)
+
+    async def run():
+        await dispatcher.enqueue(REFUSED, "Potwierdzenie", "Dziękujemy")
+        await dispatcher.send_batch()
+        assert dispatcher.outbox[0]['dead']
+        # Within the retention: kept for inspection
+        await dispatcher.send_batch()
+        assert len(dispatcher.outbox) == 1
+        dispatcher.outbox[0]['dead_at'] -= 120
+        await dispatcher.send_batch()
+
+    asyncio.run(run())
+    assert dispatcher.outbox == []
+    assert make_dispatcher().outbox == []
@@ -0,0 +1,137 @@
+"""
+Fiserv gateway client against httpx.MockTransport
+Run from the backend directory (pip install -r requirements-dev.txt):
+    python -m pytest tests/test_fiserv_gateway.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils import fiserv_gateway
+from app.utils.fiserv_gateway import CircuitOpenError, FiservGatewayClient, GatewayError
+
+
+class StubGateway:
+    """Answers each request with the next scripted status (or raises it if it is an exception)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={'orderId': 'ORD-1'})
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    """Records the backoff ranges drawn from and makes every retry immediate"""
+    ranges = []
+
+    def uniform(low, high):
+        ranges.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(fiserv_gateway.random, 'uniform', uniform)
+    return ranges
+
+
+def make_client(handler, **config) -> FiservGatewayClient:
+    return FiservGatewayClient('https://gateway.test', 'key', 'secret', transport=httpx.MockTransport(handler),
+                               config={'max_retries': 3, 'backoff_base': 0.2, 'backoff_max': 0.5,
+                                       'breaker_threshold': 10, 'breaker_reset_seconds': 30, **config})
+
+
+def test_retries_with_full_jitter_until_success(jitter):
+    gateway = StubGateway(503, httpx.ConnectError("refused"), 429, 200)
+    client = make_client(gateway)
+
+    assert asyncio.run(client.get_order_status('ORD-1')) == {'orderId': 'ORD-1'}
+    assert len(gateway.requests) == 4
+    # Ceilings double from backoff_base and are capped at backoff_max
+    assert jitter == [(0, 0.2), (0, 0.4), (0, 0.5)]
+    assert client.breaker.state == 'closed' and client.breaker.failures == 0
+    assert gateway.requests[0].headers['Api-Key'] == 'key'
+    assert gateway.requests[0].headers['Message-Signature']
+
+
+def test_post_is_not_retried_after_reaching_the_server(jitter):
+    gateway = StubGateway(502)
+    client = make_client(gateway)
+
+    async def run():
+        return await client.request('POST', '/orders/ORD-1', {'requestType': 'ReturnTransaction'})
+
+    assert asyncio.run(run()).status_code == 502
+    assert len(gateway.requests) == 1
+    assert jitter == []
+
+
+def test_gives_up_after_max_retries(jitter):
+    gateway = StubGateway(*[503] * 3)
+    client = make_client(gateway, max_retries=2)
+
+    with pytest.raises(GatewayError):
+        asyncio.run(client.get_order_status('ORD-1'))
+    assert len(gateway.requests) == 3
+
+
+def test_breaker_opens_after_threshold_failures(jitter):
+    gateway = StubGateway(*[httpx.ConnectError("refused")] * 2)
+    client = make_client(gateway, max_retries=0, breaker_threshold=2)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(GatewayError):
+                await client.get_order_status('ORD-1')
+        assert client.breaker.state == 'open'
+        # Rejected without touching the network
+        with pytest.raises(CircuitOpenError):
+            await client.get_order_status('ORD-1')
+
+    asyncio.run(run())
+    assert len(gateway.requests) == 2
+
+
+def test_half_open_trial_admits_one_call_and_closes_on_success(jitter):
+    gateway = StubGateway(httpx.ConnectError("refused"), 200)
+    client = make_client(gateway, max_retries=0, breaker_threshold=1, breaker_reset_seconds=0)
+
+    async def run():
+        with pytest.raises(GatewayError):
+            await client.get_order_status('ORD-1')
+        assert client.breaker.state == 'half_open'
+        return await client.get_order_status('ORD-1')
+
+    assert asyncio.run(run()) == {'orderId': 'ORD-1'}
+    assert client.breaker.state == 'closed'
+
+
+def test_cancelled_trial_releases_the_half_open_slot(jitter):
+    entered, never = asyncio.Event(), asyncio.Event()
+
+    async def hanging(request: httpx.Request) -> httpx.Response:
+        entered.set()
+        await never.wait()
+
+    client = make_client(hanging, max_retries=0, breaker_threshold=1, breaker_reset_seconds=0)
+    client.breaker.record_failure()
+
+    async def run():
+        trial = asyncio.create_task(client.get_order_status('ORD-1'))
+        await entered.wait()
+        # Only one call at a time while half-open
+        with pytest.raises(CircuitOpenError):
+            await client.get_order_status('ORD-1')
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # The slot is free again: the next call is admitted as the new trial
+        assert client.breaker.before_call() is True
+
+    asyncio.run(run())
@@ -3,7 +3,7 @@ import { useParams, useNavigate } from 'react-router-dom'
 import Layout from '../components/Layout'
 import { ArrowLeftIcon, QrCodeIcon } from '@heroicons/react/24/outline'
 import { BuildingLibraryIcon, HeartIcon, FireIcon } from '@heroicons/react/24/outline'
-import { apiCall } from '../utils/api'
+import { apiCall, idempotencyKeyFor } from '../utils/api'
 
 export default function GoalPage() {
   const { goalId } = useParams()
@@ -27,13 +27,11 @@ export default function GoalPage() {
 
   const loadGoalData = async () => {
     try {
-      const [goalData, orgData] = await Promise.all([
-        apiCall(`/organization/goal/${goalId}`),
-        apiCall('/organization')
-      ])
+      // One round trip: goal, organization and payment config
+      const data = await apiCall(`/bootstrap/${goalId}`)
       
-      setGoal(goalData)
-      setOrganization(orgData)
+      setGoal(data.goal)
+      setOrganization(data.organization)
     } catch (error) {
       console.error('Error loading goal:', error)
       navigate('/')
@@ -86,20 +84,22 @@ export default function GoalPage() {
     setSubmitting(true)
 
     try {
+      const body = JSON.stringify({
+        goal_id: goalId,
+        organization_id: organization?.id || 'misjonarze',
+        amount: finalAmount,
+        donor_name: donorName || null,
+        donor_email: donorEmail || null,
+        message: message || null,
+        is_anonymous: false
+      })
       const response = await fetch(`${window.location.origin}/bramkamvp/api/payments/initiate`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKeyFor(body),
         },
-        body: JSON.stringify({
-          goal_id: goalId,
-          organization_id: organization?.id || 'misjonarze',
-          amount: finalAmount,
-          donor_name: donorName || null,
-          donor_email: donorEmail || null,
-          message: message || null,
-          is_anonymous: false
-        })
+        body
       })
 
       if (!response.ok) {
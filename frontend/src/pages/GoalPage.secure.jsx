@@ -42,16 +42,11 @@ export default function GoalPage() {
 
   const loadData = async () => {
     try {
-      const [goalResponse, orgResponse] = await Promise.all([
-        fetch(getApiUrl(`/organization/goal/${goalId}`)),
-        fetch(getApiUrl('/organization'))
-      ])
+      const response = await fetch(getApiUrl(`/bootstrap/${goalId}`))
+      const data = await response.json()
       
-      const goalData = await goalResponse.json()
-      const orgData = await orgResponse.json()
-      
-      setGoal(goalData)
-      setOrganization(orgData)
+      setGoal(data.goal)
+      setOrganization(data.organization)
     } catch (error) {
       console.error('Error loading data:', error)
     } finally {
@@ -15,13 +15,11 @@ export default function HomePage() {
 
   const loadData = async () => {
     try {
-      const [orgData, statsData] = await Promise.all([
-        apiCall('/organization'),
-        apiCall('/organization/stats')
-      ])
+      // One round trip: organization, progress stats and payment config
+      const data = await apiCall('/bootstrap')
       
-      setOrganization(orgData)
-      setStats(statsData)
+      setOrganization(data.organization)
+      setStats(data.stats)
     } catch (error) {
       console.error('Error loading data:', error)
     } finally {
@@ -15,16 +15,11 @@ export default function HomePage() {
 
   const loadData = async () => {
     try {
-      const [orgResponse, statsResponse] = await Promise.all([
-        fetch(apiUrl('/organization')),
-        fetch(apiUrl('/organization/stats'))
-      ])
+      const response = await fetch(apiUrl('/bootstrap'))
+      const data = await response.json()
       
-      const orgData = await orgResponse.json()
-      const statsData = await statsResponse.json()
-      
-      setOrganization(orgData)
-      setStats(statsData)
+      setOrganization(data.organization)
+      setStats(data.stats)
     } catch (error) {
       console.error('Error loading data:', error)
     } finally {
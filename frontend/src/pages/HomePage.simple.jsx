@@ -22,16 +22,11 @@ export default function HomePage() {
 
   const loadData = async () => {
     try {
-      const [orgResponse, statsResponse] = await Promise.all([
-        fetch(getApiUrl('/organization')),
-        fetch(getApiUrl('/organization/stats'))
-      ])
+      const response = await fetch(getApiUrl('/bootstrap'))
+      const data = await response.json()
       
-      const orgData = await orgResponse.json()
-      const statsData = await statsResponse.json()
-      
-      setOrganization(orgData)
-      setStats(statsData)
+      setOrganization(data.organization)
+      setStats(data.stats)
     } catch (error) {
       console.error('Error loading data:', error)
     } finally {
@@ -33,11 +33,28 @@ export const apiCall = async (endpoint, options = {}) => {
   return response.json();
 };
 
+// Idempotency-Key for a request body: repeated submits of the same body (a
+// double-tapped donate button) reuse the key, so the backend answers them with
+// the first response instead of creating a second payment
+const idempotencyKeys = new Map();
+
+export const idempotencyKeyFor = (body) => {
+  if (!idempotencyKeys.has(body)) {
+    const key = window.crypto?.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    idempotencyKeys.set(body, key);
+  }
+  return idempotencyKeys.get(body);
+};
+
 // Specific API endpoints
 export const API = {
   organization: () => `${API_BASE}/organization`,
   organizationStats: () => `${API_BASE}/organization/stats`,
   organizationGoal: (goalId) => `${API_BASE}/organization/goal/${goalId}`,
+  bootstrap: () => `${API_BASE}/bootstrap`,
+  goalBootstrap: (goalId) => `${API_BASE}/bootstrap/${goalId}`,
   paymentsInitiate: () => `${API_BASE}/payments/initiate`,
   paymentStatus: (paymentId) => `${API_BASE}/payments/${paymentId}/status`,
   paymentFormData: (paymentId) => `${API_BASE}/payments/${paymentId}/form-data`,